@@ -0,0 +1,121 @@
+"""Benchmark for the numeric auto-cast run on every loaded file.
+
+Compares :func:`kml_pipeline.auto_cast_numeric` with the previous
+implementation (two regex passes per cell) on a synthetic table of string
+columns, as produced by ``read_table``, and checks both give the same
+result.
+
+    python benchmarks/bench_auto_cast.py --rows 1000000 --cols 50
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from kml_pipeline import MISSING_VALS, auto_cast_numeric  # noqa: E402
+
+
+def legacy_auto_cast_numeric(df, headers=None):
+    """The regex-per-cell implementation this benchmark measures against."""
+    field_types = {}
+    headers = list(df.columns) if headers is None else headers
+    if df.empty or not headers:
+        return field_types
+
+    int_pattern = re.compile(r"^-?\d+$")
+    float_pattern = re.compile(r"^-?\d+(?:[.,]\d+)?$")
+
+    for header in headers:
+        series = df[header].astype(str).str.strip()
+        normalized = series.str.replace(",", ".", regex=False)
+        non_empty = normalized[~series.str.lower().isin(MISSING_VALS)]
+
+        if non_empty.empty:
+            continue
+
+        if non_empty.map(lambda val: bool(int_pattern.fullmatch(val))).all():
+            if not non_empty.map(lambda val: -2**63 <= int(val) < 2**63).all():
+                # Integers wider than int64 are kept as text
+                continue
+            numeric_series = pd.to_numeric(normalized, errors="coerce").astype("Int64")
+            if series.eq("").any():
+                # pandas >= 3 no longer upcasts Int64 to object to hold ""
+                numeric_series = numeric_series.astype(object)
+            df[header] = numeric_series.where(~series.eq(""), "")
+            field_types[header] = "Int"
+        elif non_empty.map(lambda val: bool(float_pattern.fullmatch(val))).all():
+            numeric_series = pd.to_numeric(normalized, errors="coerce")
+            df[header] = numeric_series.where(~series.eq(""), "")
+            field_types[header] = "Float"
+    return field_types
+
+
+def make_table(rows, cols, seed=0):
+    """Build a string table mixing int, float, sparse and text columns."""
+    rng = np.random.default_rng(seed)
+    data = {}
+    for j in range(cols):
+        kind = j % 5
+        if kind == 0:
+            values = rng.integers(-100000, 100000, rows).astype(str)
+            if j % 10 == 5:
+                # Blank cells in an integer column are kept as ""
+                values[rng.random(rows) < 0.1] = ''
+            elif j % 20 == 10:
+                # 20-digit IDs do not fit into int64 and stay text
+                values = np.char.add('9', np.char.zfill(rng.integers(0, 10**18, rows).astype(str), 19))
+        elif kind == 1:
+            values = np.char.replace(np.round(rng.normal(50, 20, rows), 3).astype(str), '.', ',')
+        elif kind == 2:
+            values = np.round(rng.uniform(30, 60, rows), 6).astype(str)
+            values[rng.random(rows) < 0.3] = 'null'
+        elif kind == 3:
+            values = np.char.add('item ', rng.integers(0, 1000, rows).astype(str))
+        else:
+            # Numeric-looking head with text further down: defeats the sample check
+            values = rng.integers(0, 10, rows).astype(str)
+            values[rows // 2:] = 'n' + values[rows // 2:]
+        data[f'col{j}'] = values
+    return pd.DataFrame(data, dtype=str)
+
+
+def run(func, table):
+    df = table.copy()
+    started = time.perf_counter()
+    field_types = func(df)
+    return time.perf_counter() - started, df, field_types
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--cols', type=int, default=50)
+    parser.add_argument('--skip-legacy', action='store_true', help='time only the current implementation')
+    args = parser.parse_args(argv)
+
+    table = make_table(args.rows, args.cols)
+    print(f"{args.rows} rows x {args.cols} columns")
+
+    new_time, new_df, new_types = run(auto_cast_numeric, table)
+    print(f"auto_cast_numeric:        {new_time:8.2f} s")
+    if args.skip_legacy:
+        return 0
+
+    old_time, old_df, old_types = run(legacy_auto_cast_numeric, table)
+    print(f"legacy_auto_cast_numeric: {old_time:8.2f} s")
+    print(f"speedup:                  {old_time / new_time:8.1f}x")
+
+    if new_types != old_types or not new_df.equals(old_df):
+        print("results differ", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
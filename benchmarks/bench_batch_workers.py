@@ -0,0 +1,90 @@
+"""Benchmark for batch jobs converting geometries in several processes.
+
+Runs the same job through ``kml_to_csv.py --config`` with one and with
+``--workers`` processes and checks both succeed and write the same file.
+The jobs run with PyQt6 made unimportable, as on a server without Qt, so
+the check fails if the worker processes load the GUI.
+
+    python benchmarks/bench_batch_workers.py --rows 20000 --workers 4
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+SCRIPT = os.path.join(ROOT, 'kml_to_csv.py')
+
+
+def write_table(path, rows, vertices, seed=0):
+    """Write a ``;``-separated table of WKT polygons with ``vertices`` points each."""
+    rng = np.random.default_rng(seed)
+    angles = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+    with open(path, 'w', encoding='utf-8') as fh:
+        fh.write('id;value;WKT\n')
+        for i in range(rows):
+            lon, lat = rng.uniform(30, 60), rng.uniform(50, 60)
+            radius = rng.uniform(0.001, 0.01) * (1 + 0.2 * rng.random(vertices))
+            ring = [f"{lon + r * np.cos(a):.6f} {lat + r * np.sin(a):.6f}" for r, a in zip(radius, angles)]
+            ring.append(ring[0])
+            fh.write(f"{i};{rng.integers(0, 1000)};POLYGON (({', '.join(ring)}))\n")
+
+
+def run_job(workdir, input_file, workers, env):
+    output = os.path.join(workdir, f'out_{workers}.kml')
+    config = os.path.join(workdir, f'job_{workers}.json')
+    with open(config, 'w', encoding='utf-8') as fh:
+        json.dump({'input': input_file, 'output': output, 'delimiter': ';',
+                   'grouping': 'numerical', 'group_field': 'value', 'workers': workers}, fh)
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, SCRIPT, '--config', config], env=env,
+                            capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        print(f"workers={workers} failed:\n{result.stdout}{result.stderr}", file=sys.stderr)
+        return elapsed, None
+    return elapsed, output
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--vertices', type=int, default=64)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # A PyQt6 package that fails on import, ahead of any installed one
+        stub = os.path.join(workdir, 'stub', 'PyQt6')
+        os.makedirs(stub)
+        with open(os.path.join(stub, '__init__.py'), 'w', encoding='utf-8') as fh:
+            fh.write('raise ImportError("PyQt6 is not available")\n')
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [os.path.dirname(stub), env.get('PYTHONPATH')]))
+
+        input_file = os.path.join(workdir, 'polygons.csv')
+        write_table(input_file, args.rows, args.vertices)
+        print(f"{args.rows} polygons x {args.vertices} vertices")
+
+        single_time, single = run_job(workdir, input_file, 1, env)
+        print(f"workers=1:  {single_time:8.2f} s")
+        multi_time, multi = run_job(workdir, input_file, args.workers, env)
+        print(f"workers={args.workers}:  {multi_time:8.2f} s")
+        if single is None or multi is None:
+            return 1
+        print(f"speedup:    {single_time / multi_time:8.1f}x")
+
+        with open(single, 'rb') as a, open(multi, 'rb') as b:
+            if a.read() != b.read():
+                print("results differ", file=sys.stderr)
+                return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,284 @@
+"""Filter formulas: parsing and vectorized evaluation.
+
+A formula is parsed into an expression tree once and evaluated column by
+column, never row by row::
+
+    formula    := term (('or' | '|') term)*
+    term       := factor (('and' | '&') factor)*
+    factor     := ('not' | '!' | '~') factor | '(' formula ')' | predicate
+    predicate  := field op value
+                | field ['not'] 'in' '(' value (',' value)* ')'
+                | field ['not'] 'between' value 'and' value
+                | field 'is' ['not'] 'null'
+                | field ('startswith' | 'endswith' | 'contains') value
+    op         := '=' | '==' | '!=' | '<>' | '<' | '<=' | '>' | '>='
+
+Keywords are case-insensitive.  A field is a column name as is, spaces and
+Cyrillic letters included, or quoted with backticks; the longest matching
+column name wins.  A value is a number, a quoted string or bare text up to
+the next ``and``/``or`` or parenthesis, so ``Value > 2,5`` compares with
+2.5.  In an ``in`` list the comma separates the values: decimal commas
+are quoted there, as in ``Value in ("2,5", 3)``.
+
+Numeric fields are compared as numbers (with numexpr when it is installed,
+which evaluates large arrays on all cores); the other fields as text.
+"""
+import operator
+import re
+
+import numpy as np
+import pandas as pd
+
+try:
+    import numexpr
+except ImportError:  # optional: numeric predicates then run on plain numpy
+    numexpr = None
+
+COMPARISON_OPS = ('==', '!=', '<>', '<=', '>=', '=', '<', '>')
+TEXT_OPS = ('startswith', 'endswith', 'contains')
+KEYWORDS = ('and', 'or', 'not', 'in', 'between', 'is', 'null') + TEXT_OPS
+# Arrays shorter than this are compared with numpy: numexpr only pays off
+# once its threads have enough work
+NUMEXPR_MIN_SIZE = 100000
+
+_NUMBER = re.compile(r'[-+]?(?:\d+(?:[.,]\d*)?|[.,]\d+)(?:[eE][-+]?\d+)?')
+_BARE_VALUE = re.compile(r'''(?:(?!\s+(?:and|or)\b)[^&|()\[\]'"])+''', re.IGNORECASE)
+_BARE_LIST_VALUE = re.compile(r'''(?:(?!\s+(?:and|or)\b)[^&|()\[\],'"])+''', re.IGNORECASE)
+_KEYWORD = re.compile(r'(%s)\b' % '|'.join(KEYWORDS), re.IGNORECASE)
+_WORD = re.compile(r'\w+')
+_SPACE = re.compile(r'\s*')
+_CLOSING = {'(': ')', '[': ']'}
+_NUMPY_OPS = {
+    '==': operator.eq, '!=': operator.ne, '<': operator.lt,
+    '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+}
+
+
+class FilterError(ValueError):
+    """Invalid formula; ``position`` is the 0-based offset of the problem."""
+
+    def __init__(self, message, position):
+        super().__init__(f"{message} (позиция {position + 1})")
+        self.position = position
+
+
+class _Parser:
+    """Recursive descent parser producing the tuples evaluated below."""
+
+    def __init__(self, text, columns):
+        self.text = text
+        self.pos = 0
+        self.columns = sorted(set(columns), key=len, reverse=True)
+
+    def parse(self):
+        tree = self.formula()
+        self.skip()
+        if self.pos < len(self.text):
+            raise FilterError("Непонятный текст", self.pos)
+        return tree
+
+    def skip(self):
+        self.pos = _SPACE.match(self.text, self.pos).end()
+
+    def keyword(self, *words):
+        """Consume and return one of ``words`` if it comes next."""
+        self.skip()
+        match = _KEYWORD.match(self.text, self.pos)
+        if match and match.group(1).lower() in words:
+            self.pos = match.end()
+            return match.group(1).lower()
+        return None
+
+    def symbol(self, *symbols):
+        self.skip()
+        for symbol in symbols:
+            if self.text.startswith(symbol, self.pos):
+                self.pos += len(symbol)
+                return symbol
+        return None
+
+    def formula(self):
+        tree = self.term()
+        while self.keyword('or') or self.symbol('|'):
+            tree = ('or', tree, self.term())
+        return tree
+
+    def term(self):
+        tree = self.factor()
+        while self.keyword('and') or self.symbol('&'):
+            tree = ('and', tree, self.factor())
+        return tree
+
+    def factor(self):
+        if self.keyword('not') or self.symbol('!', '~'):
+            return ('not', self.factor())
+        if self.symbol('('):
+            tree = self.formula()
+            if not self.symbol(')'):
+                raise FilterError("Ожидается ')'", self.pos)
+            return tree
+        return self.predicate()
+
+    def field(self):
+        self.skip()
+        start = self.pos
+        if self.text.startswith('`', start):
+            end = self.text.find('`', start + 1)
+            if end == -1:
+                raise FilterError("Незакрытая кавычка `", start)
+            name = self.text[start + 1:end]
+            if name not in self.columns:
+                raise FilterError(f"Неизвестное поле «{name}»", start)
+            self.pos = end + 1
+            return name, start
+        for exact in (True, False):
+            for name in self.columns:
+                end = start + len(name)
+                candidate = self.text[start:end]
+                if (candidate == name if exact else candidate.casefold() == name.casefold()) \
+                        and self._ends_word(name, end):
+                    self.pos = end
+                    return name, start
+        word = _WORD.match(self.text, start)
+        if word:
+            raise FilterError(f"Неизвестное поле «{word.group()}»", start)
+        raise FilterError("Ожидается имя поля", start)
+
+    def _ends_word(self, name, end):
+        if end >= len(self.text) or not _WORD.fullmatch(name[-1]):
+            return True
+        return not _WORD.match(self.text[end])
+
+    def value(self, bare=_BARE_VALUE):
+        """Return a literal as ``(text, position)``; unquoted text is matched by ``bare``."""
+        self.skip()
+        start = self.pos
+        quote = self.text[start:start + 1]
+        if quote in ('"', "'"):
+            end = self.text.find(quote, start + 1)
+            if end == -1:
+                raise FilterError(f"Незакрытая кавычка {quote}", start)
+            self.pos = end + 1
+            return self.text[start + 1:end], start
+        match = bare.match(self.text, start)
+        if not match or not match.group().strip():
+            raise FilterError("Ожидается значение", start)
+        self.pos = match.end()
+        return match.group().strip(), start
+
+    def value_list(self):
+        opening = self.symbol('(', '[')
+        if not opening:
+            raise FilterError("Ожидается список значений в скобках", self.pos)
+        values = [self.value(_BARE_LIST_VALUE)]
+        while self.symbol(','):
+            values.append(self.value(_BARE_LIST_VALUE))
+        if not self.symbol(_CLOSING[opening]):
+            raise FilterError(f"Ожидается '{_CLOSING[opening]}'", self.pos)
+        return values
+
+    def predicate(self):
+        field = self.field()
+        op = self.symbol(*COMPARISON_OPS)
+        if op:
+            op = {'=': '==', '<>': '!='}.get(op, op)
+            return ('compare', field, op, self.value())
+        negate = bool(self.keyword('not'))
+        word = self.keyword('in', 'between', *(() if negate else ('is',) + TEXT_OPS))
+        if word == 'in':
+            return ('in', field, self.value_list(), negate)
+        if word == 'between':
+            low = self.value()
+            if not self.keyword('and'):
+                raise FilterError("Ожидается 'and'", self.pos)
+            return ('between', field, low, self.value(), negate)
+        if word == 'is':
+            negate = bool(self.keyword('not'))
+            if not self.keyword('null'):
+                raise FilterError("Ожидается 'null'", self.pos)
+            return ('null', field, negate)
+        if word in TEXT_OPS:
+            return ('text', field, word, self.value())
+        raise FilterError("Ожидается оператор сравнения", self.pos)
+
+
+def parse_filter(text, columns):
+    """Parse ``text`` into an expression tree over the fields ``columns``.
+
+    Raises :class:`FilterError` pointing at the first problem.
+    """
+    return _Parser(text, columns).parse()
+
+
+def evaluate_filter(tree, values, missing=('',)):
+    """Evaluate a parsed filter into a boolean array.
+
+    ``values(field)`` returns a float array for numeric fields, NaN where
+    the value is missing, and a string or categorical Series for the
+    others, where ``missing`` lists the (lowercase) spellings matched by
+    ``is null``.  Predicates on categoricals are evaluated once per
+    category and looked up by code.
+    """
+    kind = tree[0]
+    if kind == 'and':
+        return evaluate_filter(tree[1], values, missing) & evaluate_filter(tree[2], values, missing)
+    if kind == 'or':
+        return evaluate_filter(tree[1], values, missing) | evaluate_filter(tree[2], values, missing)
+    if kind == 'not':
+        return ~evaluate_filter(tree[1], values, missing)
+
+    (field, position) = tree[1]
+    column = values(field)
+    if isinstance(column, np.ndarray):
+        return _evaluate_numeric(tree, field, position, column)
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        categories = pd.Series(column.cat.categories)
+        lookup = np.append(_evaluate_text(tree, categories, missing),
+                           _evaluate_text(tree, pd.Series([np.nan], dtype=categories.dtype), missing))
+        return lookup[column.cat.codes.to_numpy()]
+    return _evaluate_text(tree, column, missing)
+
+
+def _evaluate_text(tree, column, missing):
+    kind = tree[0]
+    if kind == 'compare':
+        result = _NUMPY_OPS[tree[2]](column, tree[3][0])
+    elif kind == 'in':
+        result = column.isin([text for text, _ in tree[2]])
+    elif kind == 'between':
+        result = (column >= tree[2][0]) & (column <= tree[3][0])
+    elif kind == 'null':
+        result = column.isna() | column.str.strip().str.lower().isin(list(missing))
+    else:
+        method = getattr(column.str, tree[2])
+        result = method(tree[3][0], regex=False) if tree[2] == 'contains' else method(tree[3][0])
+    result = result.fillna(False).to_numpy(dtype=bool)
+    return ~result if kind in ('in', 'between', 'null') and tree[-1] else result
+
+
+def _number(literal, field):
+    text, position = literal
+    if not _NUMBER.fullmatch(text):
+        raise FilterError(f"Поле «{field}» числовое, ожидается число, а не «{text}»", position)
+    return float(text.replace(',', '.'))
+
+
+def _compare(column, op, number):
+    if numexpr is not None and len(column) >= NUMEXPR_MIN_SIZE:
+        return numexpr.evaluate(f'column {op} number', local_dict={'column': column, 'number': number})
+    return _NUMPY_OPS[op](column, number)
+
+
+def _evaluate_numeric(tree, field, position, column):
+    kind = tree[0]
+    if kind == 'compare':
+        return _compare(column, tree[2], _number(tree[3], field))
+    if kind == 'in':
+        result = np.isin(column, [_number(literal, field) for literal in tree[2]])
+    elif kind == 'between':
+        result = _compare(column, '>=', _number(tree[2], field)) & _compare(column, '<=', _number(tree[3], field))
+    elif kind == 'null':
+        result = np.isnan(column)
+    else:
+        raise FilterError(f"'{tree[2]}' применим только к текстовым полям, а «{field}» числовое", position)
+    return ~result if tree[-1] else result
@@ -0,0 +1,2108 @@
+"""The KML Generator window; started through ``kml_to_csv.py``."""
+import copy
+import functools
+import os
+import sys
+import time
+
+from PyQt6.QtWidgets import (QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLabel,
+                             QPushButton, QFileDialog, QLineEdit, QComboBox, QColorDialog,
+                             QCheckBox, QSpinBox, QTableView, QHeaderView,
+                             QMessageBox, QRadioButton, QButtonGroup, QGroupBox, QScrollArea,
+                             QProgressBar, QDoubleSpinBox)
+from PyQt6.QtGui import QColor, QFont, QStandardItemModel, QStandardItem
+from PyQt6.QtCore import Qt, QRect, pyqtSignal, QEvent, QThread, QAbstractTableModel, QModelIndex
+
+import pandas as pd
+
+from kml_filter import FilterError
+from kml_pipeline import (
+    ColumnarFile, ExcelWorkbook, FieldTypeCache, FilterCache, KmlPipelineError,
+    OperationCancelled, TypedColumns, auto_cast_numeric, build_categorical_groups,
+    build_numeric_groups, bundled_icon_path, bundled_icons, count_numeric_groups,
+    encode_categories, find_lonlat_fields, find_wkt_field, format_range_value, generate_kml,
+    infer_field_types, is_columnar_file, is_excel_file, numeric_values, read_table,
+    sorted_numeric_values,
+)
+
+# Invalid rows listed in the generation summary
+MAX_REPORTED_ROWS = 20
+# Geometry values are cut to this many characters in the preview
+PREVIEW_MAX_TEXT = 1000
+
+
+class DataFrameTableModel(QAbstractTableModel):
+    """Read-only table model showing a DataFrame without copying it.
+
+    Cells are converted to text only when the view asks for them, so the
+    preview scrolls through any number of rows at constant cost.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._df = pd.DataFrame()
+        self._headers = []
+        self._field_types = {}
+
+    def set_frame(self, df, headers, field_types):
+        """Show ``df`` with ``headers`` labelled by their ``field_types``."""
+        self.beginResetModel()
+        self._df = df
+        self._headers = list(headers)
+        self._field_types = dict(field_types)
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._df.index)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else min(len(self._headers), len(self._df.columns))
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role not in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.ToolTipRole):
+            return None
+        text = str(self._df.iat[index.row(), index.column()])
+        if self._field_types.get(self._headers[index.column()]) == 'Geometry' and len(text) > PREVIEW_MAX_TEXT:
+            text = text[:PREVIEW_MAX_TEXT]
+        return text
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            if section >= len(self._headers):
+                return None
+            header_name = self._headers[section]
+            return f"{header_name}\n({self._field_types.get(header_name, 'auto')})"
+        return str(section + 1)
+
+
+class CheckableComboBox(QComboBox):
+    """A QComboBox allowing multiple selection via checkable items."""
+
+    selection_changed = pyqtSignal()
+
+    def __init__(self, parent=None, show_count=False):
+        super().__init__(parent)
+        self.setModel(QStandardItemModel(self))
+        self._pressed_index = None
+        # Use the pressed signal and handle state changes manually so that
+        # the check state is always updated before we emit signals.
+        # This prevents issues where a column could not be re-enabled after
+        # being toggled off (especially for the first column in the list).
+        self.view().pressed.connect(self.handle_item_pressed)
+        self.view().viewport().installEventFilter(self)
+        self.setEditable(True)
+        self.lineEdit().setReadOnly(True)
+        self.lineEdit().setPlaceholderText("")
+        self.lineEdit().installEventFilter(self)
+        self.show_count = show_count
+        self.select_all_text = "Выбрать все"
+        # Track the order in which items are checked so that callers can
+        # retrieve selected values respecting user choice order.
+        self.selection_order = []
+
+    def addItem(self, text, data=None):
+        item = QStandardItem(text)
+        item.setFlags(Qt.ItemFlag.ItemIsUserCheckable | Qt.ItemFlag.ItemIsEnabled)
+        item.setData(Qt.CheckState.Unchecked, Qt.ItemDataRole.CheckStateRole)
+        if data is not None:
+            item.setData(data, Qt.ItemDataRole.UserRole)
+        self.model().appendRow(item)
+        self.update_display_text()
+
+    def clear(self):
+        self.model().clear()
+        self.selection_order = []
+        self.update_display_text()
+
+    def handle_item_pressed(self, index):
+        """Toggle check state for the pressed item and update dependent UI."""
+        self._pressed_index = index
+        item = self.model().itemFromIndex(index)
+        if item.text() == self.select_all_text:
+            # Toggle all items based on the current state of the select-all item
+            new_state = (Qt.CheckState.Unchecked
+                         if item.checkState() == Qt.CheckState.Checked
+                         else Qt.CheckState.Checked)
+            item.setCheckState(new_state)
+            self.selection_order = []
+            for i in range(self.model().rowCount()):
+                cur_item = self.model().item(i)
+                if cur_item.text() == self.select_all_text:
+                    continue
+                cur_item.setCheckState(new_state)
+                if new_state == Qt.CheckState.Checked:
+                    self.selection_order.append(cur_item.text())
+        else:
+            # Toggle the individual item
+            new_state = (Qt.CheckState.Unchecked
+                         if item.checkState() == Qt.CheckState.Checked
+                         else Qt.CheckState.Checked)
+            item.setCheckState(new_state)
+            if new_state == Qt.CheckState.Checked:
+                if item.text() not in self.selection_order:
+                    self.selection_order.append(item.text())
+            else:
+                if item.text() in self.selection_order:
+                    self.selection_order.remove(item.text())
+        self.update_select_all_state()
+        self.update_display_text()
+        self.selection_changed.emit()
+        self.showPopup()
+
+    def eventFilter(self, obj, event):
+        if obj is self.lineEdit() and event.type() == QEvent.Type.MouseButtonPress:
+            self.showPopup()
+            return True
+        if obj is self.view().viewport() and event.type() == QEvent.Type.MouseButtonRelease:
+            index = self.view().indexAt(event.pos())
+            if index.isValid() and (self._pressed_index is None or index != self._pressed_index):
+                self.handle_item_pressed(index)
+            self._pressed_index = None
+            return True
+        return super().eventFilter(obj, event)
+
+    def checkedItems(self):
+        # Return checked items in the exact order they were selected by the user
+        return list(self.selection_order)
+
+    def checkedIndices(self):
+        """Return the integer indices of all checked items.
+
+        The first selectable column resides at row 1 because row 0 is the
+        "select all" entry.  If custom data has been set for an item it will be
+        returned instead of the positional index, allowing callers to rely on
+        stable identifiers.
+        """
+        indices = []
+        for i in range(self.model().rowCount()):
+            item = self.model().item(i)
+            if item.text() == self.select_all_text:
+                continue
+            if item.checkState() == Qt.CheckState.Checked:
+                data = item.data(Qt.ItemDataRole.UserRole)
+                indices.append(data if data is not None else i - 1)
+        return indices
+
+    def update_display_text(self):
+        checked = self.checkedItems()
+        if self.show_count:
+            total = 0
+            for i in range(self.model().rowCount()):
+                if self.model().item(i).text() != self.select_all_text:
+                    total += 1
+            self.lineEdit().setText(f"Выбрано {len(checked)} из {total}")
+        else:
+            self.lineEdit().setText(", ".join(checked))
+
+    def set_all_checked(self, checked: bool):
+        self.selection_order = []
+        for i in range(self.model().rowCount()):
+            item = self.model().item(i)
+            if item.text() == self.select_all_text:
+                continue
+            item.setCheckState(Qt.CheckState.Checked if checked else Qt.CheckState.Unchecked)
+            if checked:
+                self.selection_order.append(item.text())
+        self.update_select_all_state()
+        self.update_display_text()
+        self.selection_changed.emit()
+
+    def set_checked_items(self, items):
+        """Programmatically set checked items using the provided order."""
+        self.selection_order = []
+        for i in range(self.model().rowCount()):
+            item = self.model().item(i)
+            if item.text() == self.select_all_text:
+                continue
+            item.setCheckState(Qt.CheckState.Unchecked)
+        for name in items:
+            matches = self.model().findItems(name)
+            if matches:
+                itm = matches[0]
+                itm.setCheckState(Qt.CheckState.Checked)
+                self.selection_order.append(name)
+        self.update_select_all_state()
+        self.update_display_text()
+
+    def update_select_all_state(self):
+        select_all_item = None
+        total = 0
+        checked = 0
+        for i in range(self.model().rowCount()):
+            item = self.model().item(i)
+            if item.text() == self.select_all_text:
+                select_all_item = item
+                continue
+            total += 1
+            if item.checkState() == Qt.CheckState.Checked:
+                checked += 1
+        if not select_all_item:
+            return
+        if checked == 0:
+            select_all_item.setCheckState(Qt.CheckState.Unchecked)
+        elif checked == total:
+            select_all_item.setCheckState(Qt.CheckState.Checked)
+        else:
+            select_all_item.setCheckState(Qt.CheckState.PartiallyChecked)
+
+
+class DataLoadWorker(QThread):
+    """Read a file, cast numeric columns and infer field types off the GUI thread.
+
+    Emits ``loaded`` with a dict holding ``base_df`` (numeric columns cast
+    and low-cardinality text columns dictionary-encoded in place, the only
+    copy of the data kept by the window) and
+    ``field_types``, or ``failed`` with the error text.  After
+    :meth:`cancel` the worker stops at the next check and emits neither.
+
+    With a :class:`ColumnarFile` in ``read_options['columnar']`` only the
+    ``read_options['columns']`` (all by default) are read and the types
+    come from the schema; the dict then also holds these ``columns``.
+    """
+
+    progress = pyqtSignal(int, str)  # per mille, message
+    loaded = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, file_path, read_options, parent=None):
+        super().__init__(parent)
+        self.file_path = file_path
+        self.read_options = read_options
+        self._cancel_requested = False
+        self._last_permille = -1
+
+    def cancel(self):
+        self._cancel_requested = True
+
+    def _check_cancel(self):
+        if self._cancel_requested:
+            raise OperationCancelled()
+
+    def _on_read_progress(self, done, total):
+        self._check_cancel()
+        permille = done * 1000 // total if total else 1000
+        if permille != self._last_permille:
+            self._last_permille = permille
+            self.progress.emit(permille, f"Чтение файла: {done / 1048576:.1f} из {total / 1048576:.1f} МБ")
+
+    def run(self):
+        try:
+            columnar = self.read_options.get('columnar')
+            if columnar is not None:
+                columns = self.read_options.get('columns')
+                base_df, field_types = columnar.read(columns, progress=self._on_read_progress)
+            else:
+                base_df = read_table(self.file_path, progress=self._on_read_progress, **self.read_options)
+                field_types = None
+            self._check_cancel()
+            result = {'base_df': base_df, 'field_types': {}}
+            if columnar is not None:
+                result['columns'] = columns
+            if not base_df.columns.empty:
+                if field_types is None:
+                    self.progress.emit(1000, 'Определение типов столбцов…')
+                    headers = base_df.columns.tolist()
+                    field_types = auto_cast_numeric(base_df, headers)
+                    self._check_cancel()
+                    field_types.update(infer_field_types(base_df, headers))
+                    self._check_cancel()
+                encode_categories(base_df, field_types)
+                self._check_cancel()
+                result['field_types'] = field_types
+            self.loaded.emit(result)
+        except OperationCancelled:
+            pass
+        except Exception as e:
+            self.failed.emit(str(e))
+
+
+class KmlGenerationWorker(QThread):
+    """Run :func:`kml_pipeline.generate_kml` off the GUI thread.
+
+    ``progress`` carries rows processed, total rows, placemarks written and
+    rows per second.  Emits ``done`` with the generation stats and elapsed
+    time, ``failed`` with the error, or ``cancelled`` after :meth:`cancel`;
+    nothing is written to the output file unless generation completes.
+    """
+
+    progress = pyqtSignal(int, int, int, float)
+    done = pyqtSignal(object, float)
+    failed = pyqtSignal(object)
+    cancelled = pyqtSignal()
+
+    def __init__(self, df, output_file, options, numbers=None, parent=None):
+        super().__init__(parent)
+        self.df = df
+        self.numbers = numbers
+        self.output_file = output_file
+        self.options = options
+        self._cancel_requested = False
+        self._started = 0.0
+
+    def cancel(self):
+        self._cancel_requested = True
+
+    def _on_progress(self, rows_done, total_rows, placemarks):
+        if self._cancel_requested:
+            raise OperationCancelled()
+        elapsed = time.monotonic() - self._started
+        rate = rows_done / elapsed if elapsed > 0 else 0.0
+        self.progress.emit(rows_done, total_rows, placemarks, rate)
+
+    def run(self):
+        self._started = time.monotonic()
+        try:
+            stats = generate_kml(self.df, self.output_file, self.options, progress=self._on_progress,
+                                 numbers=self.numbers)
+        except OperationCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            self.failed.emit(e)
+        else:
+            self.done.emit(stats, time.monotonic() - self._started)
+
+
+class KmlGeneratorApp(QWidget):
+    def __init__(self):
+        super().__init__()
+        self.data = []
+        self.filtered_data = []  # Store data after applying filter expressions
+        self.headers = []
+        self.group_colors = {}
+        self.groups = []
+        self.end_color = QColor(255, 0, 0)
+        self.single_color = QColor('#FF0000')
+        self.field_types = {}
+        self.encoding = 'utf-8'
+        self.manual_group_bounds = {}
+        self.base_df = pd.DataFrame()
+        self._columns = TypedColumns(self.base_df)
+        self.all_headers = []
+        self.all_field_types = {}
+        self.selected_columns = []
+        self.grouping_mode = 'numerical'
+        self.group_opacity = 100
+        self.current_header_combo = None # To keep track of the currently open QComboBox for header editing
+        self.current_header_combo_column = -1 # Track which column the combo belongs to
+        self.numerical_field_is_int = False
+        self._legend_cache = None
+        self.df = pd.DataFrame()
+        self.filtered_df = pd.DataFrame()
+        self._filter_rows = None
+        self._load_worker = None
+        self._generation_worker = None
+        self._workbook = None
+        self._columnar = None
+        # File, options and open handles behind the loaded data
+        self._loaded_source = None
+        self._type_cache = FieldTypeCache()
+        self._filter_cache = FilterCache()
+
+        self.initUI()
+
+    def initUI(self):
+        """Инициализация пользовательского интерфейса с обновленным дизайном."""
+        self.setWindowTitle('KML Generator')
+        self.setGeometry(100, 100, 950, 850)
+
+        self.setStyleSheet("""
+            QWidget { background-color: #F8F8F8;
+font-family: Arial; }
+            QGroupBox {
+                border: 1px solid #D0D0D0;
+border-radius: 7px; margin-top: 10px;
+                padding-top: 15px; background-color: #FFFFFF;
+            }
+            QGroupBox::title {
+                subcontrol-origin: margin;
+left: 10px; padding: 0 5px;
+                color: #333333; font-weight: bold; font-size: 11px;
+            }
+            QScrollArea {
+                border: none;
+            }
+        """)
+
+        scroll_area = QScrollArea()
+        scroll_area.setWidgetResizable(True)
+        main_container = QWidget()
+        layout = QVBoxLayout(main_container)
+        main_app_layout = QVBoxLayout(self)
+        main_app_layout.addWidget(scroll_area)
+        self.setLayout(main_app_layout)
+
+        bold_large_font = QFont()
+        bold_large_font.setPointSize(10)
+        bold_large_font.setBold(True)
+
+        label_style = "QLabel { color: #333333;font-weight: bold;}"
+        button_style = "QPushButton { background-color: #555555; color: white; border-radius: 5px;padding: 5px 10px;font-weight: bold; }"
+        button_hover_style = "QPushButton:hover { background-color: #777777}"
+        lineedit_style = "QLineEdit { background-color: #EEEEEE; border: 1px solid #CCCCCC; padding: 3px; }"
+        combobox_style = "QComboBox { background-color: #EEEEEE;border: 1px solid #CCCCCC; padding: 1px; }"
+        spinbox_style = "QSpinBox { background-color: #EEEEEE; border: 1px solid #CCCCCC; padding: 3px; }"
+        checkbox_style = "QCheckBox { color: #333333;font-weight: bold;}"
+        radio_button_style = "QRadioButton { color: #333333;font-weight: bold;}"
+        table_style = """
+            QTableView { background-color: #FFFFFF; border: 1px solid #CCCCCC; gridline-color: #E0E0E0;
+}
+            QHeaderView::section { background-color: #E0E0E0; color: #333333; padding: 4px;
+border: 1px solid #CCCCCC; font-weight: bold; }
+        """
+
+
+        file_group_box = QGroupBox("Исходный файл/Настройка вывода")
+        file_group_box.setFont(bold_large_font)
+        file_group_layout = QVBoxLayout()
+        file_group_layout.setContentsMargins(10, 15, 10, 15)
+        file_group_box.setLayout(file_group_layout)
+        
+        file_layout = QHBoxLayout()
+        self.file_label = QLabel('Исходный файл (txt, csv, excel):')
+        self.file_label.setStyleSheet(label_style)
+        file_layout.addWidget(self.file_label)
+        self.file_path_input = QLineEdit()
+        self.file_path_input.setStyleSheet(lineedit_style)
+        file_layout.addWidget(self.file_path_input)
+        self.browse_button = QPushButton('Выбрать')
+        self.browse_button.clicked.connect(self.browse_file)
+        self.browse_button.setStyleSheet(button_style + button_hover_style)
+        file_layout.addWidget(self.browse_button)
+        file_group_layout.addLayout(file_layout)
+
+        output_file_layout = QHBoxLayout()
+        self.output_file_label = QLabel('Выходной KML/KMZ файл:')
+        self.output_file_label.setStyleSheet(label_style)
+        output_file_layout.addWidget(self.output_file_label)
+        self.output_file_path_input = QLineEdit()
+        self.output_file_path_input.setStyleSheet(lineedit_style)
+        output_file_layout.addWidget(self.output_file_path_input)
+        self.browse_output_button = QPushButton('Выбрать')
+        self.browse_output_button.clicked.connect(self.browse_output_file)
+        self.browse_output_button.setStyleSheet(button_style + button_hover_style)
+        output_file_layout.addWidget(self.browse_output_button)
+        file_group_layout.addLayout(output_file_layout)
+
+        tiles_layout = QHBoxLayout()
+        self.use_tiles_checkbox = QCheckBox('Разбить на тайлы (Region/LOD)')
+        self.use_tiles_checkbox.setChecked(False)
+        self.use_tiles_checkbox.setStyleSheet(checkbox_style)
+        self.use_tiles_checkbox.stateChanged.connect(self.toggle_tile_size_input)
+        tiles_layout.addWidget(self.use_tiles_checkbox)
+        self.tile_size_label = QLabel('Меток в тайле:')
+        self.tile_size_label.setStyleSheet(label_style)
+        tiles_layout.addWidget(self.tile_size_label)
+        self.tile_size_spinbox = QSpinBox()
+        self.tile_size_spinbox.setRange(100, 100000)
+        self.tile_size_spinbox.setSingleStep(500)
+        self.tile_size_spinbox.setValue(2000)
+        self.tile_size_spinbox.setStyleSheet(spinbox_style)
+        tiles_layout.addWidget(self.tile_size_spinbox)
+        self.workers_label = QLabel('Процессов:')
+        self.workers_label.setStyleSheet(label_style)
+        tiles_layout.addWidget(self.workers_label)
+        self.workers_spinbox = QSpinBox()
+        self.workers_spinbox.setRange(1, max(os.cpu_count() or 1, 1))
+        self.workers_spinbox.setValue(1)
+        self.workers_spinbox.setToolTip('Число процессов для преобразования геометрий')
+        self.workers_spinbox.setStyleSheet(spinbox_style)
+        tiles_layout.addWidget(self.workers_spinbox)
+        tiles_layout.addStretch(1)
+        file_group_layout.addLayout(tiles_layout)
+        self.toggle_tile_size_input()
+
+        simplify_layout = QHBoxLayout()
+        self.simplify_checkbox = QCheckBox('Упростить геометрию')
+        self.simplify_checkbox.setChecked(False)
+        self.simplify_checkbox.setStyleSheet(checkbox_style)
+        self.simplify_checkbox.stateChanged.connect(self.toggle_simplify_inputs)
+        simplify_layout.addWidget(self.simplify_checkbox)
+        self.simplify_tolerance_label = QLabel('Допуск:')
+        self.simplify_tolerance_label.setStyleSheet(label_style)
+        simplify_layout.addWidget(self.simplify_tolerance_label)
+        self.simplify_tolerance_spinbox = QDoubleSpinBox()
+        self.simplify_tolerance_spinbox.setDecimals(7)
+        self.simplify_tolerance_spinbox.setRange(0.0000001, 1.0)
+        self.simplify_tolerance_spinbox.setSingleStep(0.00001)
+        self.simplify_tolerance_spinbox.setValue(0.0001)
+        self.simplify_tolerance_spinbox.setToolTip('В единицах координат (градусах для WGS84)')
+        self.simplify_tolerance_spinbox.setStyleSheet(spinbox_style)
+        simplify_layout.addWidget(self.simplify_tolerance_spinbox)
+        self.simplify_target_label = QLabel('или размер файла, МБ:')
+        self.simplify_target_label.setStyleSheet(label_style)
+        simplify_layout.addWidget(self.simplify_target_label)
+        self.simplify_target_spinbox = QSpinBox()
+        self.simplify_target_spinbox.setRange(0, 100000)
+        self.simplify_target_spinbox.setValue(0)
+        self.simplify_target_spinbox.setSpecialValueText('—')
+        self.simplify_target_spinbox.setToolTip('Подобрать допуск по размеру файла; 0 — использовать допуск')
+        self.simplify_target_spinbox.setStyleSheet(spinbox_style)
+        self.simplify_target_spinbox.valueChanged.connect(self.toggle_simplify_inputs)
+        simplify_layout.addWidget(self.simplify_target_spinbox)
+        precision_label = QLabel('Знаков в координатах:')
+        precision_label.setStyleSheet(label_style)
+        simplify_layout.addWidget(precision_label)
+        self.precision_spinbox = QSpinBox()
+        # -1 is shown as "все": coordinates are written in full
+        self.precision_spinbox.setRange(-1, 15)
+        self.precision_spinbox.setValue(-1)
+        self.precision_spinbox.setSpecialValueText('все')
+        self.precision_spinbox.setToolTip('Число знаков после запятой; 6 знаков в градусах — около 10 см')
+        self.precision_spinbox.setStyleSheet(spinbox_style)
+        simplify_layout.addWidget(self.precision_spinbox)
+        simplify_layout.addStretch(1)
+        file_group_layout.addLayout(simplify_layout)
+        self.toggle_simplify_inputs()
+
+        sheet_layout = QHBoxLayout()
+        self.sheet_label = QLabel('Лист Excel:')
+        self.sheet_label.setStyleSheet(label_style)
+        sheet_layout.addWidget(self.sheet_label)
+        self.sheet_combo = QComboBox()
+        self.sheet_combo.setPlaceholderText('Выберите лист')
+        self.sheet_combo.setStyleSheet(combobox_style)
+        self.sheet_combo.currentTextChanged.connect(self.on_sheet_changed)
+        self.sheet_combo.setEnabled(False)
+        sheet_layout.addWidget(self.sheet_combo)
+        file_group_layout.addLayout(sheet_layout)
+
+        columns_layout = QHBoxLayout()
+        self.columns_label = QLabel('Столбцы для работы:')
+        self.columns_label.setStyleSheet(label_style)
+        columns_layout.addWidget(self.columns_label)
+        self.columns_combo = CheckableComboBox(show_count=True)
+        self.columns_combo.setStyleSheet(combobox_style)
+        self.columns_combo.lineEdit().setPlaceholderText('Выберите столбцы…')
+        self.columns_combo.selection_changed.connect(self.on_columns_changed)
+        self.columns_combo.setEnabled(False)
+        columns_layout.addWidget(self.columns_combo)
+        file_group_layout.addLayout(columns_layout)
+
+        options_layout = QHBoxLayout()
+        self.delimiter_label = QLabel('Разделитель:')
+        self.delimiter_label.setStyleSheet(label_style)
+        options_layout.addWidget(self.delimiter_label)
+        self.delimiter_input = QLineEdit(';')
+        self.delimiter_input.textChanged.connect(self.on_file_settings_changed)
+        self.delimiter_input.setFixedWidth(30)
+        self.delimiter_input.setStyleSheet(lineedit_style)
+        options_layout.addWidget(self.delimiter_input)
+
+        self.has_header_checkbox = QCheckBox('Наличик заголовка')
+        self.has_header_checkbox.setChecked(True)
+        self.has_header_checkbox.stateChanged.connect(self.on_file_settings_changed)
+        self.has_header_checkbox.setStyleSheet(checkbox_style)
+        options_layout.addWidget(self.has_header_checkbox)
+
+        self.start_row_label = QLabel('Данные начинаются со строки:')
+        self.start_row_label.setStyleSheet(label_style)
+        options_layout.addWidget(self.start_row_label)
+        self.start_row_spinbox = QSpinBox()
+        self.start_row_spinbox.setMinimum(1)
+        self.start_row_spinbox.setValue(1)
+        self.start_row_spinbox.valueChanged.connect(self.on_file_settings_changed)
+        self.start_row_spinbox.setStyleSheet(spinbox_style)
+        options_layout.addWidget(self.start_row_spinbox)
+        file_group_layout.addLayout(options_layout)
+
+        encoding_layout = QHBoxLayout()
+        self.encoding_label = QLabel('Кодировка файла:')
+        self.encoding_label.setStyleSheet(label_style)
+        encoding_layout.addWidget(self.encoding_label)
+        self.encoding_group = QButtonGroup(self)
+        self.utf8_radio = QRadioButton('UTF-8')
+        self.utf8_radio.setChecked(True)
+        self.utf8_radio.toggled.connect(self.on_file_settings_changed)
+        self.cp1251_radio = QRadioButton('CP1251')
+        self.cp1251_radio.toggled.connect(self.on_file_settings_changed)
+        self.encoding_group.addButton(self.utf8_radio)
+        self.encoding_group.addButton(self.cp1251_radio)
+        
+        self.utf8_radio.setStyleSheet(radio_button_style)
+        self.cp1251_radio.setStyleSheet(radio_button_style)
+        encoding_layout.addWidget(self.utf8_radio)
+        encoding_layout.addWidget(self.cp1251_radio)
+        file_group_layout.addLayout(encoding_layout)
+
+        load_progress_layout = QHBoxLayout()
+        self.load_progress_bar = QProgressBar()
+        self.load_progress_bar.setRange(0, 1000)
+        load_progress_layout.addWidget(self.load_progress_bar)
+        self.cancel_load_button = QPushButton('Отмена')
+        self.cancel_load_button.clicked.connect(self.cancel_loading)
+        self.cancel_load_button.setStyleSheet(button_style + button_hover_style)
+        load_progress_layout.addWidget(self.cancel_load_button)
+        self.load_progress_bar.setVisible(False)
+        self.cancel_load_button.setVisible(False)
+        file_group_layout.addLayout(load_progress_layout)
+        layout.addWidget(file_group_box)
+        
+        coord_group_box = QGroupBox("Настройка системы координат/KML метки")
+        coord_group_box.setFont(bold_large_font)
+        coord_layout = QVBoxLayout()
+        coord_layout.setContentsMargins(10, 15, 10, 15)
+        coord_group_box.setLayout(coord_layout)
+        self.coord_system_label = QLabel('Система координат:')
+        self.coord_system_label.setStyleSheet(label_style)
+        coord_layout.addWidget(self.coord_system_label)
+        self.coord_system_group = QButtonGroup(self)
+        coord_system_radio_layout = QHBoxLayout()
+        self.wkt_radio = QRadioButton('WKT')
+        self.wkt_radio.setChecked(True)
+        self.wkt_radio.toggled.connect(self.on_coord_system_changed)
+        self.wkt_radio.setStyleSheet(radio_button_style)
+        coord_system_radio_layout.addWidget(self.wkt_radio)
+        self.coord_system_group.addButton(self.wkt_radio)
+        self.lonlat_radio = QRadioButton('Longitude/Latitude')
+        self.lonlat_radio.toggled.connect(self.on_coord_system_changed)
+        self.lonlat_radio.setStyleSheet(radio_button_style)
+        coord_system_radio_layout.addWidget(self.lonlat_radio)
+        self.coord_system_group.addButton(self.lonlat_radio)
+        coord_system_radio_layout.addStretch(1)
+        coord_layout.addLayout(coord_system_radio_layout)
+        
+        self.wkt_field_layout = QHBoxLayout()
+        self.wkt_field_label = QLabel('WKT поле:')
+        self.wkt_field_label.setStyleSheet(label_style)
+        self.wkt_field_combo = QComboBox()
+        self.wkt_field_combo.setStyleSheet(combobox_style)
+        self.wkt_field_layout.addWidget(self.wkt_field_label)
+        self.wkt_field_layout.addWidget(self.wkt_field_combo)
+        coord_layout.addLayout(self.wkt_field_layout)
+
+        self.lon_lat_field_layout = QHBoxLayout()
+        self.lon_field_label = QLabel('Longitude поле:')
+        self.lon_field_label.setStyleSheet(label_style)
+        self.lon_field_combo = QComboBox()
+        self.lon_field_combo.setStyleSheet(combobox_style)
+        self.lat_field_label = QLabel('Latitude поле:')
+        self.lat_field_label.setStyleSheet(label_style)
+        self.lat_field_combo = QComboBox()
+        self.lat_field_combo.setStyleSheet(combobox_style)
+        
+        self.lon_lat_field_layout.addWidget(self.lon_field_label)
+        self.lon_lat_field_layout.addWidget(self.lon_field_combo)
+        self.lon_lat_field_layout.addWidget(self.lat_field_label)
+        self.lon_lat_field_layout.addWidget(self.lat_field_combo)
+        coord_layout.addLayout(self.lon_lat_field_layout)
+
+        self.lon_field_label.setVisible(False)
+        self.lon_field_combo.setVisible(False)
+        self.lat_field_label.setVisible(False)
+        self.lat_field_combo.setVisible(False)
+        
+        self.add_label_button = QPushButton('Выбрать поле для label')
+        self.add_label_button.clicked.connect(self.toggle_kml_label_field)
+        self.add_label_button.setStyleSheet(button_style + button_hover_style)
+        coord_layout.addWidget(self.add_label_button)
+
+        self.kml_label_field_layout = QHBoxLayout()
+        self.kml_label_field_label = QLabel('Поле для label:')
+        self.kml_label_field_label.setStyleSheet(label_style)
+        self.kml_label_field_combo = QComboBox()
+        self.kml_label_field_combo.setStyleSheet(combobox_style)
+        self.kml_label_field_layout.addWidget(self.kml_label_field_label)
+        self.kml_label_field_layout.addWidget(self.kml_label_field_combo)
+        coord_layout.addLayout(self.kml_label_field_layout)
+
+        self.kml_label_field_label.setVisible(False)
+        self.kml_label_field_combo.setVisible(False)
+
+        self.show_kml_labels_checkbox = QCheckBox('Отображать label на карте')
+        self.show_kml_labels_checkbox.setChecked(True)
+        self.show_kml_labels_checkbox.setStyleSheet(checkbox_style)
+        coord_layout.addWidget(self.show_kml_labels_checkbox)
+        self.show_kml_labels_checkbox.setVisible(False)
+
+        # Description fields selection
+        desc_layout = QHBoxLayout()
+        self.description_fields_label = QLabel('Поля для описания:')
+        self.description_fields_label.setStyleSheet(label_style)
+        self.description_fields_combo = CheckableComboBox()
+        self.description_fields_combo.setStyleSheet(combobox_style)
+        desc_layout.addWidget(self.description_fields_label)
+        desc_layout.addWidget(self.description_fields_combo)
+        coord_layout.addLayout(desc_layout)
+
+        # Field used to split generated KML placemarks into folders
+        folder_group_layout = QHBoxLayout()
+        self.folder_group_field_label = QLabel('Поле для группировки по папкам:')
+        self.folder_group_field_label.setStyleSheet(label_style)
+        self.folder_group_field_combo = QComboBox()
+        self.folder_group_field_combo.setStyleSheet(combobox_style)
+        folder_group_layout.addWidget(self.folder_group_field_label)
+        folder_group_layout.addWidget(self.folder_group_field_combo)
+        coord_layout.addLayout(folder_group_layout)
+
+        self.use_custom_icon_checkbox = QCheckBox('Использовать пользовательскую иконку')
+        self.use_custom_icon_checkbox.setChecked(False)
+        self.use_custom_icon_checkbox.stateChanged.connect(self.toggle_custom_icon_input)
+        self.use_custom_icon_checkbox.setStyleSheet(checkbox_style)
+        coord_layout.addWidget(self.use_custom_icon_checkbox)
+        self.icon_url_layout = QHBoxLayout()
+        self.icon_source_label = QLabel('Иконка:')
+        self.icon_source_label.setStyleSheet(label_style)
+        self.icon_source_combo = QComboBox()
+        self.icon_source_combo.addItem('По ссылке (URL)', None)
+        for icon_name in bundled_icons():
+            self.icon_source_combo.addItem(icon_name, icon_name)
+        self.icon_source_combo.setStyleSheet(combobox_style)
+        self.icon_source_combo.currentIndexChanged.connect(self.toggle_custom_icon_input)
+        self.icon_url_layout.addWidget(self.icon_source_label)
+        self.icon_url_layout.addWidget(self.icon_source_combo)
+        self.icon_url_label = QLabel('URL на иконку:')
+        self.icon_url_label.setStyleSheet(label_style)
+        self.icon_url_input = QLineEdit('http://maps.google.com/mapfiles/kml/pal2/icon18.png') # Changed default icon URL
+        self.icon_url_input.setStyleSheet(lineedit_style)
+        self.icon_url_layout.addWidget(self.icon_url_label)
+        self.icon_url_layout.addWidget(self.icon_url_input)
+        coord_layout.addLayout(self.icon_url_layout)
+        self.toggle_custom_icon_input()
+        coord_group_box.setLayout(coord_layout)
+        layout.addWidget(coord_group_box)
+        
+        self.on_coord_system_changed() 
+
+        grouping_group_box = QGroupBox("Настройка группировки")
+        grouping_group_box.setFont(bold_large_font)
+        grouping_options_layout = QVBoxLayout()
+        grouping_options_layout.setContentsMargins(10, 15, 10, 15)
+        grouping_group_box.setLayout(grouping_options_layout)
+
+        mode_layout = QHBoxLayout()
+        self.numeric_mode_radio = QRadioButton('Группировка по диапазону значений')
+        self.unique_mode_radio = QRadioButton('Групировка по уникальным значениям')
+        self.single_mode_radio = QRadioButton('Единый цвет (без группировки)')
+        self.numeric_mode_radio.setChecked(True)
+        for rb in (self.numeric_mode_radio, self.unique_mode_radio, self.single_mode_radio):
+            rb.setStyleSheet(radio_button_style)
+        self.grouping_mode_group = QButtonGroup(self)
+        self.grouping_mode_group.addButton(self.numeric_mode_radio)
+        self.grouping_mode_group.addButton(self.unique_mode_radio)
+        self.grouping_mode_group.addButton(self.single_mode_radio)
+        self.grouping_mode_group.buttonClicked.connect(self.on_grouping_mode_changed)
+        mode_layout.addWidget(self.numeric_mode_radio)
+        mode_layout.addWidget(self.unique_mode_radio)
+        mode_layout.addWidget(self.single_mode_radio)
+        mode_layout.addStretch(1)
+        grouping_options_layout.addLayout(mode_layout)
+        numerical_field_selection_layout = QHBoxLayout()
+        self.numerical_group_label = QLabel('Числовое поле для группировки:')
+        self.numerical_group_label.setStyleSheet(label_style)
+        numerical_field_selection_layout.addWidget(self.numerical_group_label)
+        self.numerical_group_field_combo = QComboBox()
+        self.numerical_group_field_combo.currentIndexChanged.connect(self.on_numerical_grouping_field_changed)
+        self.numerical_group_field_combo.setStyleSheet(combobox_style)
+        numerical_field_selection_layout.addWidget(self.numerical_group_field_combo)
+        grouping_options_layout.addLayout(numerical_field_selection_layout)
+        num_groups_layout = QHBoxLayout()
+        self.num_groups_label = QLabel('Кол-во групп:')
+        self.num_groups_label.setStyleSheet(label_style)
+        num_groups_layout.addWidget(self.num_groups_label)
+        self.num_groups_spinbox = QSpinBox()
+        self.num_groups_spinbox.setMinimum(1)
+        self.num_groups_spinbox.setMaximum(20)
+        self.num_groups_spinbox.setValue(3)
+        self.num_groups_spinbox.valueChanged.connect(self.on_numerical_grouping_field_changed)
+        self.num_groups_spinbox.setStyleSheet(spinbox_style)
+        num_groups_layout.addWidget(self.num_groups_spinbox)
+        grouping_options_layout.addLayout(num_groups_layout)
+        end_color_layout = QHBoxLayout()
+        self.end_color_label = QLabel('Конечный цвет для градиента:')
+        self.end_color_label.setStyleSheet(label_style)
+        end_color_layout.addWidget(self.end_color_label)
+        self.end_color_button = QPushButton()
+        self.end_color_button.clicked.connect(self.pick_end_color)
+        self.end_color_button.setFixedSize(20, 20)
+        end_color_layout.addWidget(self.end_color_button)
+        grouping_options_layout.addLayout(end_color_layout)
+
+        single_color_layout = QHBoxLayout()
+        self.single_color_label = QLabel('Цвет слоя:')
+        self.single_color_label.setStyleSheet(label_style)
+        single_color_layout.addWidget(self.single_color_label)
+        self.single_color_button = QPushButton()
+        self.single_color_button.clicked.connect(self.pick_single_color)
+        self.single_color_button.setFixedSize(20, 20)
+        single_color_layout.addWidget(self.single_color_button)
+        grouping_options_layout.addLayout(single_color_layout)
+
+        opacity_layout = QHBoxLayout()
+        self.opacity_label = QLabel('Прозрачность (%):')
+        self.opacity_label.setStyleSheet(label_style)
+        opacity_layout.addWidget(self.opacity_label)
+        self.opacity_spinbox = QSpinBox()
+        self.opacity_spinbox.setMinimum(0)
+        self.opacity_spinbox.setMaximum(100)
+        self.opacity_spinbox.setValue(100)
+        self.opacity_spinbox.setStyleSheet(spinbox_style)
+        self.opacity_spinbox.valueChanged.connect(self.on_opacity_changed)
+        opacity_layout.addWidget(self.opacity_spinbox)
+        grouping_options_layout.addLayout(opacity_layout)
+        self.update_end_color_button()
+        self.update_single_color_button()
+        self.numerical_color_display_layout = QVBoxLayout()
+        self.numerical_color_label = QLabel('Группы значений и цвета:')
+        self.numerical_color_label.setStyleSheet(label_style)
+        self.numerical_color_display_layout.addWidget(self.numerical_color_label)
+        grouping_options_layout.addLayout(self.numerical_color_display_layout)
+
+        categorical_field_layout = QHBoxLayout()
+        self.categorical_group_label = QLabel('Категориальное поле для группировки:')
+        self.categorical_group_label.setStyleSheet(label_style)
+        categorical_field_layout.addWidget(self.categorical_group_label)
+        self.categorical_group_field_combo = QComboBox()
+        self.categorical_group_field_combo.currentIndexChanged.connect(self.on_categorical_grouping_field_changed)
+        self.categorical_group_field_combo.setStyleSheet(combobox_style)
+        categorical_field_layout.addWidget(self.categorical_group_field_combo)
+        grouping_options_layout.addLayout(categorical_field_layout)
+
+        self.categorical_color_display_layout = QVBoxLayout()
+        self.categorical_color_label = QLabel('Уникальные значения и цвета:')
+        self.categorical_color_label.setStyleSheet(label_style)
+        self.categorical_color_display_layout.addWidget(self.categorical_color_label)
+        grouping_options_layout.addLayout(self.categorical_color_display_layout)
+
+        # Hide categorical controls initially
+        self.categorical_group_label.setVisible(False)
+        self.categorical_group_field_combo.setVisible(False)
+        self.categorical_color_label.setVisible(False)
+        self.single_color_label.setVisible(False)
+        self.single_color_button.setVisible(False)
+        layout.addWidget(grouping_group_box)
+
+        # Data filtering controls
+        filter_group_box = QGroupBox("Фильтрация данных")
+        filter_group_box.setFont(bold_large_font)
+        filter_layout = QHBoxLayout()
+        self.filter_label = QLabel('Формула фильтрации:')
+        self.filter_label.setStyleSheet(label_style)
+        filter_layout.addWidget(self.filter_label)
+        self.filter_input = QLineEdit()
+        self.filter_input.setStyleSheet(lineedit_style)
+        self.filter_input.setPlaceholderText("Пример: Column == Value and Other > 5")
+        filter_layout.addWidget(self.filter_input)
+        self.apply_filter_button = QPushButton('Применить фильтр')
+        self.apply_filter_button.setStyleSheet(button_style + button_hover_style)
+        self.apply_filter_button.clicked.connect(self.apply_filter)
+        filter_layout.addWidget(self.apply_filter_button)
+        filter_group_box.setLayout(filter_layout)
+        layout.addWidget(filter_group_box)
+
+        self.data_table = QTableView()
+        self.data_model = DataFrameTableModel(self)
+        self.data_table.setModel(self.data_model)
+        self.data_table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        self.data_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.data_table.setMinimumHeight(300)
+        self.data_table.setStyleSheet(table_style)
+        self.data_table.horizontalHeader().sectionDoubleClicked.connect(self.on_header_double_clicked)
+        layout.addWidget(self.data_table)
+
+        self.generate_button = QPushButton('Создать KML файл')
+        self.generate_button.clicked.connect(self.generate_kml)
+        self.generate_button.setStyleSheet(button_style + button_hover_style)
+        layout.addWidget(self.generate_button)
+
+        generation_progress_layout = QHBoxLayout()
+        self.generation_progress_bar = QProgressBar()
+        generation_progress_layout.addWidget(self.generation_progress_bar)
+        self.cancel_generation_button = QPushButton('Отмена')
+        self.cancel_generation_button.clicked.connect(self.cancel_generation)
+        self.cancel_generation_button.setStyleSheet(button_style + button_hover_style)
+        generation_progress_layout.addWidget(self.cancel_generation_button)
+        self.generation_progress_bar.setVisible(False)
+        self.cancel_generation_button.setVisible(False)
+        layout.addLayout(generation_progress_layout)
+
+        self.generation_status_label = QLabel('')
+        self.generation_status_label.setWordWrap(True)
+        self.generation_status_label.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
+        layout.addWidget(self.generation_status_label)
+
+        main_container.setLayout(layout)
+        scroll_area.setWidget(main_container)
+
+    def update_file_options_state(self, is_excel, is_columnar=False):
+        """Включает или отключает опции файла в зависимости от его типа."""
+        is_text = not (is_excel or is_columnar)
+        self.delimiter_input.setEnabled(is_text)
+        self.delimiter_label.setEnabled(is_text)
+        self.utf8_radio.setEnabled(is_text)
+        self.cp1251_radio.setEnabled(is_text)
+        self.encoding_label.setEnabled(is_text)
+        self.has_header_checkbox.setEnabled(not is_columnar)
+        self.start_row_label.setEnabled(not is_columnar)
+        self.start_row_spinbox.setEnabled(not is_columnar)
+        self.sheet_label.setEnabled(is_excel)
+        if not is_excel:
+            self.sheet_combo.clear()
+        self.sheet_combo.setEnabled(is_excel and self.sheet_combo.count() > 0)
+
+    def browse_file(self):
+        """Открывает диалог выбора файла и загружает данные."""
+        file_name, _ = QFileDialog.getOpenFileName(self, 'Select Data File', '',
+                                                   'All Supported Files (*.txt *.csv *.xlsx *.xls *.xlsm '
+                                                   '*.parquet *.pq *.feather *.arrow *.ipc);;'
+                                                   'Text Files (*.txt *.csv);;'
+                                                   'Excel Files (*.xlsx *.xls *.xlsm);;'
+                                                   'Parquet/Arrow Files (*.parquet *.pq *.feather *.arrow *.ipc);;'
+                                                   'All Files (*)')
+        if file_name:
+            self.file_path_input.setText(file_name)
+            is_excel = is_excel_file(file_name)
+            self.update_file_options_state(is_excel, is_columnar_file(file_name))
+            if is_excel:
+                self.load_sheet_names(file_name)
+            self.load_data(file_name)
+
+    def browse_output_file(self):
+        """Открывает диалог выбора KML/KMZ файла для сохранения."""
+        file_name, selected_filter = QFileDialog.getSaveFileName(self, 'Save KML File', '',
+                                                                 'KML Files (*.kml);;'
+                                                                 'KMZ Files (*.kmz);;'
+                                                                 'All Files (*)')
+        if file_name:
+            if not os.path.splitext(file_name)[1]:
+                file_name += '.kmz' if selected_filter.startswith('KMZ') else '.kml'
+            self.output_file_path_input.setText(file_name)
+
+    def on_file_settings_changed(self):
+        """Вызывает перезагрузку данных при изменении настроек файла."""
+        file_path = self.file_path_input.text()
+        if file_path:
+            self.load_data(file_path)
+
+    def on_sheet_changed(self, _):
+        file_path = self.file_path_input.text()
+        if file_path:
+            self.load_data(file_path)
+
+    def _excel_workbook(self, file_path):
+        """Return the open workbook of ``file_path``, opening it on first use
+        or when the file has changed on disk."""
+        if self._workbook is None or not self._workbook.matches(file_path):
+            self._close_workbook()
+            self._workbook = ExcelWorkbook(file_path)
+        return self._workbook
+
+    def _close_workbook(self):
+        # A cancelled load may still be reading it; the workbook is then closed when that read ends
+        if self._workbook is not None:
+            self._release(self._workbook)
+            self._workbook = None
+
+    def _release(self, handle):
+        # The file behind the loaded data stays open for cancel_loading until another load replaces it
+        source = self._loaded_source
+        if source is None or handle not in (source['workbook'], source['columnar']):
+            handle.close()
+
+    def _columnar_file(self, file_path):
+        """Return the open Parquet/Arrow file ``file_path``, like :meth:`_excel_workbook`."""
+        if self._columnar is None or not self._columnar.matches(file_path):
+            self._close_columnar()
+            self._columnar = ColumnarFile(file_path)
+        return self._columnar
+
+    def _close_columnar(self):
+        """Close the open Parquet/Arrow file, like :meth:`_close_workbook`."""
+        if self._columnar is not None:
+            self._release(self._columnar)
+            self._columnar = None
+
+    def load_sheet_names(self, file_path):
+        self.sheet_combo.clear()
+        try:
+            sheet_names = self._excel_workbook(file_path).sheet_names
+            self.sheet_combo.addItems(sheet_names)
+            if sheet_names:
+                self.sheet_combo.setCurrentIndex(0)
+            self.sheet_combo.setEnabled(True)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Не удалось получить список листов: {e}")
+            self.sheet_combo.setEnabled(False)
+            
+    def load_data(self, file_path, columns=None):
+        """Запускает фоновую загрузку данных из файла с учетом выбранных параметров.
+
+        Текущие данные остаются на экране до окончания загрузки и заменяются
+        целиком в :meth:`on_data_loaded`.  Для файлов Parquet/Arrow можно
+        прочитать только столбцы ``columns``; они добавляются к загруженным.
+        """
+        is_excel = is_excel_file(file_path)
+        is_columnar = is_columnar_file(file_path)
+        self.update_file_options_state(is_excel, is_columnar)
+        if is_columnar:
+            self._close_workbook()
+            if columns is not None and (self._columnar is None or not self._columnar.matches(file_path)):
+                # The file has changed since the other columns were read
+                columns = None
+            try:
+                read_options = {'columnar': self._columnar_file(file_path), 'columns': columns}
+            except Exception as e:
+                self._show_load_error(e)
+                return
+        else:
+            self._close_columnar()
+            if not is_excel:
+                self.encoding = 'utf-8' if self.utf8_radio.isChecked() else 'cp1251'
+                self._close_workbook()
+                workbook = None
+            else:
+                try:
+                    workbook = self._excel_workbook(file_path)
+                except Exception as e:
+                    self._show_load_error(e)
+                    return
+            read_options = {
+                'delimiter': self.delimiter_input.text(),
+                'has_header': self.has_header_checkbox.isChecked(),
+                'start_row': self.start_row_spinbox.value(),
+                'encoding': self.encoding,
+                'sheet_name': self.sheet_combo.currentText() if is_excel else None,
+                'workbook': workbook,
+            }
+
+        self._stop_load_worker()
+        worker = DataLoadWorker(file_path, read_options, self)
+        worker.progress.connect(self.on_load_progress)
+        worker.loaded.connect(self.on_data_loaded)
+        worker.failed.connect(self.on_load_failed)
+        worker.finished.connect(worker.deleteLater)
+        self._load_worker = worker
+
+        self.load_progress_bar.setRange(0, 1000)
+        self.load_progress_bar.setValue(0)
+        self.load_progress_bar.setFormat('Загрузка файла…')
+        self.load_progress_bar.setVisible(True)
+        self.cancel_load_button.setVisible(True)
+        self.generate_button.setEnabled(False)
+        self.apply_filter_button.setEnabled(False)
+        worker.start()
+
+    def _stop_load_worker(self):
+        """Cancel the running load, if any; its results are ignored."""
+        if self._load_worker is not None:
+            self._load_worker.cancel()
+            self._load_worker = None
+
+    def _finish_loading(self):
+        self.load_progress_bar.setVisible(False)
+        self.cancel_load_button.setVisible(False)
+        self.generate_button.setEnabled(self._generation_worker is None)
+        self.apply_filter_button.setEnabled(True)
+
+    def cancel_loading(self):
+        """Прерывает загрузку, оставляя ранее загруженные данные.
+
+        Путь и настройки файла возвращаются к загруженным данным.
+        """
+        self._stop_load_worker()
+        self._finish_loading()
+        self._restore_source()
+
+    def _remember_source(self, file_path):
+        """Record the file and options of the data just loaded from ``file_path``."""
+        previous = self._loaded_source
+        self._loaded_source = {
+            'file_path': file_path,
+            'delimiter': self.delimiter_input.text(),
+            'encoding': self.encoding,
+            'has_header': self.has_header_checkbox.isChecked(),
+            'start_row': self.start_row_spinbox.value(),
+            'sheets': [self.sheet_combo.itemText(i) for i in range(self.sheet_combo.count())],
+            'sheet': self.sheet_combo.currentIndex(),
+            'workbook': self._workbook,
+            'columnar': self._columnar,
+        }
+        self._close_replaced(previous)
+
+    def _forget_source(self):
+        previous, self._loaded_source = self._loaded_source, None
+        self._close_replaced(previous)
+
+    def _close_replaced(self, source):
+        if source is not None:
+            for handle in (source['workbook'], source['columnar']):
+                if handle is not None and handle not in (self._workbook, self._columnar):
+                    handle.close()
+
+    def _restore_source(self):
+        """Show the file and options of the loaded data again after a cancelled load."""
+        source = self._loaded_source
+        for current, kept in ((self._workbook, source and source['workbook']),
+                              (self._columnar, source and source['columnar'])):
+            if current is not None and current is not kept:
+                current.close()
+        self._workbook = source and source['workbook']
+        self._columnar = source and source['columnar']
+
+        widgets = (self.file_path_input, self.delimiter_input, self.utf8_radio, self.cp1251_radio,
+                   self.has_header_checkbox, self.start_row_spinbox, self.sheet_combo)
+        for widget in widgets:
+            widget.blockSignals(True)
+        try:
+            if source is None:
+                self.file_path_input.clear()
+                self.update_file_options_state(False)
+                return
+            file_path = source['file_path']
+            self.file_path_input.setText(file_path)
+            self.delimiter_input.setText(source['delimiter'])
+            self.encoding = source['encoding']
+            (self.utf8_radio if self.encoding == 'utf-8' else self.cp1251_radio).setChecked(True)
+            self.has_header_checkbox.setChecked(source['has_header'])
+            self.start_row_spinbox.setValue(source['start_row'])
+            self.sheet_combo.clear()
+            self.sheet_combo.addItems(source['sheets'])
+            self.sheet_combo.setCurrentIndex(source['sheet'])
+            self.update_file_options_state(is_excel_file(file_path), is_columnar_file(file_path))
+        finally:
+            for widget in widgets:
+                widget.blockSignals(False)
+
+    def on_load_progress(self, permille, message):
+        if self.sender() is not self._load_worker:
+            return
+        if self.load_progress_bar.maximum() == 0:
+            self.load_progress_bar.setRange(0, 1000)
+        self.load_progress_bar.setValue(permille)
+        self.load_progress_bar.setFormat(f"{message} (%p%)")
+
+    def on_load_failed(self, message):
+        if self.sender() is not self._load_worker:
+            return
+        self._load_worker = None
+        self._finish_loading()
+        self._show_load_error(message)
+
+    def _show_load_error(self, message):
+        QMessageBox.critical(self, "Error", f"Ошибка загрузки файла: {message}\n\nДля файлов Excel убедитесь, что установлены 'pandas' и 'openpyxl', для Parquet/Arrow — 'pyarrow'.")
+        self._forget_source()
+        self.data, self.filtered_data, self.headers, self.field_types = [], [], [], {}
+        self.manual_group_bounds = {}
+        self.base_df = pd.DataFrame()
+        self._columns = TypedColumns(self.base_df)
+        self.all_headers, self.all_field_types, self.selected_columns = [], {}, []
+        self.df = pd.DataFrame()
+        self.filtered_df = pd.DataFrame()
+        self._filter_rows = None
+        self._filter_cache.clear()
+        self._legend_cache = None
+        self.update_columns_combo()
+        self.preview_data()
+        self.update_field_combos()
+
+    def on_data_loaded(self, result):
+        """Заменяет текущие данные результатом фоновой загрузки."""
+        if self.sender() is not self._load_worker:
+            return
+        self._remember_source(self._load_worker.file_path)
+        self._load_worker = None
+        self._finish_loading()
+        if result.get('columns') is not None:
+            self._add_loaded_columns(result)
+            return
+
+        self.data = []
+        self.filtered_data = []
+        self.manual_group_bounds = {}
+        self._filter_cache.clear()
+        self._legend_cache = None
+        self.columns_combo.clear()
+        self.columns_combo.setEnabled(False)
+
+        try:
+            if result['base_df'].columns.empty:
+                self.headers = []
+                self.field_types = {}
+                self.base_df = pd.DataFrame()
+                self._columns = TypedColumns(self.base_df)
+                self.all_headers = []
+                self.all_field_types = {}
+                self.selected_columns = []
+                self.df = pd.DataFrame()
+                self.filtered_df = pd.DataFrame()
+                self._filter_rows = None
+                QMessageBox.warning(self, "Warning", "В файле не обнаружены столбцы")
+                self.update_columns_combo()
+                self.preview_data()
+                self.update_field_combos()
+                return
+
+            self.base_df = result['base_df']
+            self._columns = TypedColumns(self.base_df)
+            self.all_headers = self.base_df.columns.tolist()
+            self.selected_columns = list(range(len(self.all_headers)))
+            self.headers = self.all_headers[:]
+            self.df = self.base_df
+            self.field_types = result['field_types']
+            self._type_cache.store(self.base_df, self.field_types)
+
+            self.filtered_df = self.df
+            self._filter_rows = None
+            self.all_field_types = self.field_types.copy()
+            if hasattr(self, 'filter_input'):
+                self.filter_input.setText('')
+            self.update_columns_combo()
+
+            self.preview_data()
+            self.update_field_combos()
+            if self.grouping_mode == 'numerical':
+                self.on_numerical_grouping_field_changed()
+            elif self.grouping_mode == 'categorical':
+                self.on_categorical_grouping_field_changed()
+            else:
+                self.update_group_display()
+
+        except Exception as e:
+            self._show_load_error(e)
+
+    def _add_loaded_columns(self, result):
+        """Добавляет дочитанные столбцы файла Parquet/Arrow к загруженным."""
+        try:
+            combined = pd.concat([self.base_df, result['base_df']], axis=1)
+            self._set_columnar_frame(combined[[h for h in self.all_headers if h in combined.columns]])
+            self.all_field_types.update(result['field_types'])
+            self.on_columns_changed()
+        except Exception as e:
+            self._show_load_error(e)
+
+    def _set_columnar_frame(self, base_df):
+        """Replace the backing frame after columns of a Parquet/Arrow file were read or released."""
+        self.base_df = base_df
+        self._columns = TypedColumns(self.base_df)
+        self._type_cache.store(self.base_df, self._columnar.field_types)
+
+    def closeEvent(self, event):
+        # Cancelled workers may still be running; wait so their QThreads are not destroyed mid-run
+        self._stop_load_worker()
+        for worker in self.findChildren(QThread):
+            worker.cancel()
+            worker.wait()
+        self._forget_source()
+        self._close_workbook()
+        self._close_columnar()
+        super().closeEvent(event)
+
+    def generate_kml(self):
+        """Запускает генерацию KML-файла в фоновом потоке."""
+        output_file = self.output_file_path_input.text()
+        if not output_file:
+            QMessageBox.warning(self, "Warning", "Пожалуйста, укажите выходной KML-файл.")
+            return
+        if self.filtered_df.empty:
+            QMessageBox.warning(self, "Warning", "Нет данных для генерации KML.")
+            return
+
+        # A shallow copy keeps later edits of the table out of the running export
+        numbers = functools.partial(self._columns.numbers, rows=self._filter_rows)
+        worker = KmlGenerationWorker(self.filtered_df.copy(deep=False), output_file,
+                                     self._generation_options(), numbers, self)
+        worker.progress.connect(self.on_generation_progress)
+        worker.done.connect(self.on_generation_done)
+        worker.failed.connect(self.on_generation_failed)
+        worker.cancelled.connect(self.on_generation_cancelled)
+        worker.finished.connect(worker.deleteLater)
+        self._generation_worker = worker
+
+        self.generation_progress_bar.setRange(0, len(self.filtered_df.index))
+        self.generation_progress_bar.setValue(0)
+        self.generation_progress_bar.setFormat('Подготовка…')
+        self.generation_progress_bar.setVisible(True)
+        self.cancel_generation_button.setVisible(True)
+        self.cancel_generation_button.setEnabled(True)
+        self.generate_button.setEnabled(False)
+        self.generation_status_label.setText('')
+        worker.start()
+
+    def cancel_generation(self):
+        """Прерывает генерацию; выходной файл не создается."""
+        if self._generation_worker is not None:
+            self._generation_worker.cancel()
+            self.cancel_generation_button.setEnabled(False)
+            self.generation_progress_bar.setFormat('Отмена…')
+
+    def _finish_generation(self):
+        self._generation_worker = None
+        self.generation_progress_bar.setVisible(False)
+        self.cancel_generation_button.setVisible(False)
+        self.generate_button.setEnabled(self._load_worker is None)
+
+    def on_generation_progress(self, rows_done, total_rows, placemarks, rate):
+        if not self.cancel_generation_button.isEnabled():
+            return  # keep the cancellation notice
+        self.generation_progress_bar.setValue(rows_done)
+        self.generation_progress_bar.setFormat(
+            f"Обработано строк: {rows_done} из {total_rows}, меток: {placemarks}, {rate:.0f} строк/с")
+
+    def on_generation_done(self, stats, elapsed):
+        self._finish_generation()
+        output_file = self.sender().output_file
+        rate = stats['total_rows'] / elapsed if elapsed > 0 else 0.0
+        msg_lines = [f"KML-файл '{output_file}' успешно создан за {elapsed:.1f} с ({rate:.0f} строк/с).",
+                     f"Нанесено {stats['placed']} точек из {stats['total_rows']}, меток в файле: {stats['placemarks']}."]
+        invalid_rows = stats['invalid_rows']
+        if invalid_rows:
+            shown = ', '.join(str(row_num) for row_num in invalid_rows[:MAX_REPORTED_ROWS])
+            if len(invalid_rows) > MAX_REPORTED_ROWS:
+                shown += f" и еще {len(invalid_rows) - MAX_REPORTED_ROWS}"
+            msg_lines.append(f"Ошибка в координатах в строках: {shown}")
+        if stats['simplify_tolerance']:
+            msg_lines.append(f"Упрощение с допуском {stats['simplify_tolerance']:.7g}: "
+                             f"удалено вершин {stats['vertices_removed']}.")
+        if stats.get('simplify_target_reached') is False:
+            msg_lines.append("Заданный размер файла недостижим: допуск ограничен, "
+                             "файл получился больше заданного.")
+        self.generation_status_label.setText("\n".join(msg_lines))
+
+    def on_generation_failed(self, error):
+        self._finish_generation()
+        if isinstance(error, KmlPipelineError):
+            QMessageBox.critical(self, "Error", str(error))
+        else:
+            QMessageBox.critical(self, "Error", f"Ошибка при генерации KML: {error}")
+
+    def on_generation_cancelled(self):
+        self._finish_generation()
+        self.generation_status_label.setText("Генерация KML отменена, файл не создан.")
+
+    def _generation_options(self):
+        """Collect the KML generation settings from the widgets."""
+        if self.grouping_mode == 'numerical':
+            group_field = self.numerical_group_field_combo.currentText()
+        elif self.grouping_mode == 'categorical':
+            group_field = self.categorical_group_field_combo.currentText()
+        else:
+            group_field = None
+        use_custom_icon = self.use_custom_icon_checkbox.isChecked()
+        bundled_icon = self.icon_source_combo.currentData()
+        custom_icon_url = bundled_icon_path(bundled_icon) if bundled_icon else self.icon_url_input.text()
+        # A target file size, when given, takes precedence over the tolerance
+        simplify_tolerance = simplify_target_size = None
+        if self.simplify_checkbox.isChecked():
+            if self.simplify_target_spinbox.value() > 0:
+                simplify_target_size = self.simplify_target_spinbox.value() * 1024 * 1024
+            else:
+                simplify_tolerance = self.simplify_tolerance_spinbox.value()
+        return {
+            'use_wkt': self.wkt_radio.isChecked(),
+            'wkt_field': self.wkt_field_combo.currentText(),
+            'lon_field': self.lon_field_combo.currentText(),
+            'lat_field': self.lat_field_combo.currentText(),
+            # The label field only counts while its combo box is shown
+            'label_field': self.kml_label_field_combo.currentText() if self.kml_label_field_combo.isVisible() else None,
+            'show_labels': self.show_kml_labels_checkbox.isChecked(),
+            'description_fields': self.description_fields_combo.checkedItems(),
+            'folder_field': self.folder_group_field_combo.currentText(),
+            'grouping_mode': self.grouping_mode,
+            'group_field': group_field,
+            # A snapshot: bounds, labels and colors may be edited during the export
+            'groups': copy.deepcopy(self.groups),
+            'group_colors': {label: (c.red(), c.green(), c.blue()) for label, c in self.group_colors.items()},
+            'single_color': (self.single_color.red(), self.single_color.green(), self.single_color.blue()),
+            'opacity': self.group_opacity,
+            'icon_url': custom_icon_url if use_custom_icon and custom_icon_url else None,
+            'tile_size': self.tile_size_spinbox.value() if self.use_tiles_checkbox.isChecked() else None,
+            'workers': self.workers_spinbox.value(),
+            'coordinate_precision': self.precision_spinbox.value() if self.precision_spinbox.value() >= 0 else None,
+            'simplify_tolerance': simplify_tolerance,
+            'simplify_target_size': simplify_target_size,
+        }
+
+    def _format_range_value(self, value):
+        """Format range boundary based on current field type."""
+        return format_range_value(value, self.numerical_field_is_int)
+
+
+    def on_header_double_clicked(self, column_index):
+        """
+        Handles double-click on a table header section.
+        Opens a QComboBox to select the data type for the column.
+        """
+        if not self.headers or column_index >= len(self.headers):
+            return
+
+        # Close any existing combo box if open
+        self.close_header_combo()
+
+        header_pos = self.data_table.horizontalHeader().sectionViewportPosition(column_index)
+        header_width = self.data_table.horizontalHeader().sectionSize(column_index)
+        header_height = self.data_table.horizontalHeader().height()
+        
+        header_rect = QRect(header_pos, 0, header_width, header_height) 
+
+        combo = QComboBox(self) 
+        data_types = ['Auto', 'Int', 'Float', 'Varchar', 'Geometry'] 
+        combo.addItems(data_types)
+        combo.setStyleSheet("QComboBox { background-color: #DDDDDD; border: 1px solid #AAAAAA; padding: 1px; }")
+
+        field_name = self.headers[column_index]
+        current_type = self.field_types.get(field_name, 'Auto')
+        combo.setCurrentText(current_type)
+        
+        global_pos = self.data_table.horizontalHeader().mapToGlobal(header_rect.topLeft())
+        local_pos = self.mapFromGlobal(global_pos)
+
+        combo.setGeometry(local_pos.x(), local_pos.y(), header_rect.width(), header_rect.height())
+        
+        combo.currentIndexChanged.connect(lambda index, col=column_index, cb=combo: self.update_field_type_from_header_combo(col, cb.currentText()))
+        
+        # Install event filter on the combo box itself
+        combo.installEventFilter(self)
+
+        self.current_header_combo = combo
+        self.current_header_combo_column = column_index
+        self.current_header_combo.show()
+        # Corrected: Use Qt.FocusReason.PopupFocusReason instead of Qt.FocusReason.Popup
+        self.current_header_combo.setFocus(Qt.FocusReason.PopupFocusReason) # Set focus to the combo box, hinting it's a popup
+
+        # Add a flag to ensure it's deleted when closed
+        self.current_header_combo.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose)
+
+    def eventFilter(self, obj, event):
+        """
+        Event filter to detect when the QComboBox loses focus.
+        """
+        if obj == self.current_header_combo:
+            if event.type() == event.Type.FocusOut:
+                # Check if the combo box's popup view is still visible.
+                # If it is, the focus might have moved internally to the popup,
+                # and we should not close the combo box yet.
+                if self.current_header_combo.view().isVisible():
+                    return False # Let the event be processed normally, don't close yet
+                else:
+                    self.close_header_combo()
+                    return True # Event handled, stop propagation
+            # Handle other events if needed, e.g., closing on Escape key
+            elif event.type() == event.Type.KeyPress and event.key() == Qt.Key.Key_Escape:
+                self.close_header_combo()
+                return True # Event handled
+        return super().eventFilter(obj, event)
+
+    def close_header_combo(self):
+        """Closes and deletes the currently active header combo box."""
+        if self.current_header_combo:
+            # Disconnect signals to prevent errors during deletion
+            try:
+                self.current_header_combo.currentIndexChanged.disconnect()
+            except TypeError:
+                pass # Already disconnected or not connected
+            
+            # Remove the event filter before deleting, although WA_DeleteOnClose handles this
+            self.current_header_combo.removeEventFilter(self)
+            
+            self.current_header_combo.close() # Close will trigger WA_DeleteOnClose
+            self.current_header_combo = None
+            self.current_header_combo_column = -1
+            
+            # Re-update preview to ensure header text is correct and consistent
+            self.preview_data()
+
+
+    def update_field_type_from_header_combo(self, column_index, new_type):
+        """
+        Updates the field type based on the selection from the QComboBox in the header.
+        This function is called when the combo box's selected index changes.
+        """
+        if column_index == -1 or column_index >= len(self.headers):
+            return
+
+        field_name = self.headers[column_index]
+        if new_type == 'Auto':
+            new_type = self._type_cache.get(self.base_df, field_name)
+        self.field_types[field_name] = new_type
+        self._columns.invalidate(field_name)
+        self._legend_cache = None
+
+        self.update_field_combos()
+        if self.grouping_mode == 'numerical':
+            self.on_numerical_grouping_field_changed()
+        elif self.grouping_mode == 'categorical':
+            self.on_categorical_grouping_field_changed()
+        else:
+            self.update_group_display()
+        
+    def update_field_combos(self):
+        """
+        Updates the available fields in all QComboBox widgets based on loaded headers
+        and inferred field types.
+        """
+        if not self.headers:
+            for combo in [self.wkt_field_combo, self.lon_field_combo, self.lat_field_combo,
+                          self.numerical_group_field_combo, self.categorical_group_field_combo,
+                          self.kml_label_field_combo, self.description_fields_combo,
+                          self.folder_group_field_combo]:
+                combo.clear()
+            return
+
+        all_fields = self.headers[:]
+        
+        numerical_fields = [field for field in all_fields if self.field_types.get(field) in ['Int', 'Float']]
+        categorical_fields = [f for f in all_fields if f not in numerical_fields]
+
+        combos = [self.wkt_field_combo, self.lon_field_combo, self.lat_field_combo,
+                  self.numerical_group_field_combo, self.categorical_group_field_combo,
+                  self.kml_label_field_combo, self.folder_group_field_combo]
+        current_texts = [c.currentText() for c in combos]
+        # Preserve the order in which description fields were selected
+        selected_desc = self.description_fields_combo.checkedItems()
+
+
+        # Prevent signals from firing while repopulating combos
+        for c in combos + [self.description_fields_combo]:
+            c.blockSignals(True)
+
+
+        for c in combos:
+            c.clear()
+
+        self.description_fields_combo.clear()
+        for field in all_fields:
+            self.description_fields_combo.addItem(field)
+        # Reapply previously selected description fields respecting the
+        # original selection order
+        if selected_desc:
+            self.description_fields_combo.set_checked_items(selected_desc)
+
+        for c in [self.wkt_field_combo, self.lon_field_combo, self.lat_field_combo, self.kml_label_field_combo]:
+            c.addItems(all_fields)
+        self.folder_group_field_combo.addItem('Без группировки по папкам')
+        self.folder_group_field_combo.addItems(all_fields)
+        self.numerical_group_field_combo.addItems(numerical_fields)
+        self.categorical_group_field_combo.addItems(categorical_fields)
+
+        if current_texts[0] in all_fields:
+            self.wkt_field_combo.setCurrentText(current_texts[0])
+        if current_texts[1] in all_fields:
+            self.lon_field_combo.setCurrentText(current_texts[1])
+        if current_texts[2] in all_fields:
+            self.lat_field_combo.setCurrentText(current_texts[2])
+        
+        if current_texts[3] in numerical_fields:
+            self.numerical_group_field_combo.setCurrentText(current_texts[3])
+        elif numerical_fields:
+            self.numerical_group_field_combo.setCurrentText(numerical_fields[0])
+        else:
+            self.numerical_group_field_combo.setCurrentText('')
+
+        if current_texts[4] in categorical_fields:
+            self.categorical_group_field_combo.setCurrentText(current_texts[4])
+        elif categorical_fields:
+            self.categorical_group_field_combo.setCurrentText(categorical_fields[0])
+        else:
+            self.categorical_group_field_combo.setCurrentText('')
+
+        if current_texts[5] in all_fields:
+            self.kml_label_field_combo.setCurrentText(current_texts[5])
+        elif all_fields:
+            self.kml_label_field_combo.setCurrentText(all_fields[0])
+
+        if current_texts[6] in all_fields:
+            self.folder_group_field_combo.setCurrentText(current_texts[6])
+        else:
+            self.folder_group_field_combo.setCurrentText('Без группировки по папкам')
+
+        self._auto_select_coord_fields(current_texts)
+
+        # Re-enable signals now that combo boxes are populated
+        for c in combos + [self.description_fields_combo]:
+            c.blockSignals(False)
+
+
+    def _auto_select_coord_fields(self, previous_texts):
+        wkt_prev, lon_prev, lat_prev = previous_texts[:3]
+        headers = self.headers
+
+        wkt_candidate = None
+        if wkt_prev not in headers:
+            wkt_candidate = find_wkt_field(headers, self.field_types)
+            if wkt_candidate:
+                self.wkt_field_combo.setCurrentText(wkt_candidate)
+                self.wkt_radio.setChecked(True)
+        else:
+            wkt_candidate = wkt_prev
+
+        if (lon_prev not in headers or lat_prev not in headers) and not wkt_candidate:
+            lon_candidate, lat_candidate = find_lonlat_fields(headers)
+            if lon_candidate and lat_candidate:
+                self.lon_field_combo.setCurrentText(lon_candidate)
+                self.lat_field_combo.setCurrentText(lat_candidate)
+                self.lonlat_radio.setChecked(True)
+
+
+    def apply_filter(self):
+        """Apply the filter expression from the input field to the data.
+
+        Row masks are cached per expression, so switching back to a recent
+        filter does not evaluate it again.
+        """
+        formula = self.filter_input.text().strip()
+        if self.df.empty or not formula:
+            self.filtered_df = self.df
+            self._filter_rows = None
+        else:
+            try:
+                mask = self._filter_cache.mask(self.df, self.field_types, formula, self._columns.numbers)
+            except Exception as e:
+                QMessageBox.critical(self, "Error", f"Invalid filter: {e}")
+                if isinstance(e, FilterError):
+                    self.filter_input.setFocus()
+                    self.filter_input.setCursorPosition(e.position)
+                return
+            self._filter_rows = None if mask.all() else mask
+            self.filtered_df = self.df if self._filter_rows is None else self.df[mask]
+        self.preview_data()
+        if self.grouping_mode == 'numerical':
+            self.on_numerical_grouping_field_changed()
+        elif self.grouping_mode == 'categorical':
+            self.on_categorical_grouping_field_changed()
+        else:
+            self.update_group_display()
+
+
+    def preview_data(self):
+        """
+        Shows the filtered rows in the preview table; cells are read from
+        the DataFrame only when they are scrolled into view.
+        Headers will show field name and its inferred/selected type.
+        """
+        preview_df = self.filtered_df if not self.filtered_df.empty else self.df.head(0)
+        self.data_model.set_frame(preview_df, self.headers, self.field_types)
+
+
+    def update_columns_combo(self):
+        self.columns_combo.blockSignals(True)
+        self.columns_combo.clear()
+        self.columns_combo.addItem(self.columns_combo.select_all_text)
+        for idx, field in enumerate(self.all_headers):
+            # Store the original column index in the item for later retrieval
+            self.columns_combo.addItem(field, idx)
+
+        # Ensure the default selection reflects previously chosen columns
+        # and that the displayed count shows all selected by default.
+        checked_names = [
+            self.all_headers[i] for i in self.selected_columns
+            if i < len(self.all_headers)
+        ]
+        self.columns_combo.set_checked_items(checked_names)
+        self.columns_combo.blockSignals(False)
+
+        total = len(self.all_headers)
+        enabled = total > 0
+        self.columns_combo.setEnabled(enabled)
+
+    def on_columns_changed(self):
+        indices = sorted(self.columns_combo.checkedIndices())
+        self.selected_columns = indices
+
+        if not indices:
+            self.headers = []
+            self.data = []
+            self.filtered_data = []
+            self.field_types = {}
+            self.df = pd.DataFrame()
+            self.filtered_df = pd.DataFrame()
+            self._filter_rows = None
+            self._filter_cache.clear()
+            self._legend_cache = None
+            if hasattr(self, 'filter_input'):
+                self.filter_input.setText('')
+            self.update_field_combos()
+            self.preview_data()
+            if self.grouping_mode == 'numerical':
+                self.on_numerical_grouping_field_changed()
+            elif self.grouping_mode == 'categorical':
+                self.on_categorical_grouping_field_changed()
+            else:
+                self.update_group_display()
+            return
+
+        headers = [self.all_headers[i] for i in indices]
+        if self._columnar is not None:
+            # Parquet/Arrow columns are read when checked and released when
+            # unchecked; the view is updated once the new ones arrive
+            missing = [h for h in headers if h not in self.base_df.columns]
+            if missing:
+                self.load_data(self.file_path_input.text(), columns=missing)
+                return
+            if len(headers) < len(self.base_df.columns):
+                self._set_columnar_frame(self.base_df[headers])
+
+        self.headers = headers
+        # A projection of the single backing frame: with copy-on-write the
+        # column data is shared until someone writes to it
+        self.df = self.base_df if self.headers == list(self.base_df.columns) else self.base_df[self.headers]
+        self.field_types = {h: self.all_field_types.get(h, 'auto') for h in self.headers}
+        self.filtered_df = self.df
+        self._filter_rows = None
+        self._filter_cache.clear()
+        self._legend_cache = None
+        if hasattr(self, 'filter_input'):
+            self.filter_input.setText('')
+        self.update_field_combos()
+        self.preview_data()
+        if self.grouping_mode == 'numerical':
+            self.on_numerical_grouping_field_changed()
+        elif self.grouping_mode == 'categorical':
+            self.on_categorical_grouping_field_changed()
+        else:
+            self.update_group_display()
+
+    def on_coord_system_changed(self):
+        """Переключает видимость полей WKT или Longitude/Latitude."""
+        use_wkt = self.wkt_radio.isChecked()
+
+        for i in range(self.wkt_field_layout.count()):
+            widget = self.wkt_field_layout.itemAt(i).widget()
+            if widget:
+                widget.setVisible(use_wkt)
+
+        for i in range(self.lon_lat_field_layout.count()):
+            widget = self.lon_lat_field_layout.itemAt(i).widget()
+            if widget:
+                widget.setVisible(not use_wkt)
+
+    def toggle_kml_label_field(self):
+        """Показать или скрыть поле для выбора поля KML метки."""
+        is_visible = self.kml_label_field_label.isVisible() 
+        
+        self.kml_label_field_label.setVisible(not is_visible)
+        self.kml_label_field_combo.setVisible(not is_visible)
+        self.show_kml_labels_checkbox.setVisible(not is_visible)
+        
+        if not is_visible:
+            self.add_label_button.setText('Скрыть поле KML метки')
+        else:
+            self.add_label_button.setText('Выбрать поле для label')
+
+    def toggle_simplify_inputs(self):
+        """Enable the tolerance or the target size depending on the choice."""
+        enabled = self.simplify_checkbox.isChecked()
+        by_size = self.simplify_target_spinbox.value() > 0
+        self.simplify_tolerance_label.setEnabled(enabled and not by_size)
+        self.simplify_tolerance_spinbox.setEnabled(enabled and not by_size)
+        self.simplify_target_label.setEnabled(enabled)
+        self.simplify_target_spinbox.setEnabled(enabled)
+
+    def toggle_tile_size_input(self):
+        """Размер тайла доступен только при включенном разбиении."""
+        self.tile_size_spinbox.setEnabled(self.use_tiles_checkbox.isChecked())
+        self.tile_size_label.setEnabled(self.use_tiles_checkbox.isChecked())
+
+    def toggle_custom_icon_input(self):
+        """Показать или скрыть выбор иконки и поле ввода URL."""
+        is_checked = self.use_custom_icon_checkbox.isChecked()
+        use_url = self.icon_source_combo.currentData() is None
+        self.icon_source_label.setVisible(is_checked)
+        self.icon_source_combo.setVisible(is_checked)
+        self.icon_url_label.setVisible(is_checked and use_url)
+        self.icon_url_input.setVisible(is_checked and use_url)
+
+    def on_grouping_mode_changed(self):
+        """Switch between numerical, categorical, and single-color modes."""
+        if self.numeric_mode_radio.isChecked():
+            self.grouping_mode = 'numerical'
+        elif self.unique_mode_radio.isChecked():
+            self.grouping_mode = 'categorical'
+        else:
+            self.grouping_mode = 'single'
+
+        numerical = self.grouping_mode == 'numerical'
+        categorical = self.grouping_mode == 'categorical'
+        single = self.grouping_mode == 'single'
+
+        for w in [self.numerical_group_label, self.numerical_group_field_combo,
+                   self.num_groups_label, self.num_groups_spinbox,
+                   self.end_color_label, self.end_color_button,
+                   self.numerical_color_label]:
+            w.setVisible(numerical)
+
+        self.categorical_group_label.setVisible(categorical)
+        self.categorical_group_field_combo.setVisible(categorical)
+        self.categorical_color_label.setVisible(categorical)
+
+        self.single_color_label.setVisible(single)
+        self.single_color_button.setVisible(single)
+
+        if self.grouping_mode == 'numerical':
+            self.on_numerical_grouping_field_changed()
+        elif self.grouping_mode == 'categorical':
+            self.on_categorical_grouping_field_changed()
+        else:
+            self.update_group_display()
+    
+    def pick_end_color(self):
+        """Открывает диалог выбора цвета для конечного цвета градиента."""
+        color = QColorDialog.getColor(self.end_color, self, "Выбрать конечный цвет для градиента")
+        if color.isValid():
+            self.end_color = color
+            self.update_end_color_button()
+            if self.grouping_mode == 'numerical':
+                self.on_numerical_grouping_field_changed()
+
+    def pick_single_color(self):
+        """Открывает диалог выбора цвета слоя."""
+        color = QColorDialog.getColor(self.single_color, self, "Выбрать цвет слоя")
+        if color.isValid():
+            self.single_color = color
+            self.update_single_color_button()
+
+    def on_opacity_changed(self):
+        """Update stored group opacity when the spinbox value changes."""
+        self.group_opacity = self.opacity_spinbox.value()
+
+    def update_end_color_button(self):
+        """Обновляет цвет кнопки, отображающей конечный цвет."""
+        self.end_color_button.setStyleSheet(f"background-color: {self.end_color.name()}; border: 1px solid #888888;")
+
+    def update_single_color_button(self):
+        """Обновляет цвет кнопки, отображающей выбранный цвет слоя."""
+        self.single_color_button.setStyleSheet(f"background-color: {self.single_color.name()}; border: 1px solid #888888;")
+
+    def on_categorical_grouping_field_changed(self):
+        """Rebuild groups based on unique categorical values."""
+        self.groups = []
+        self.group_colors = {}
+
+        selected_field = self.categorical_group_field_combo.currentText()
+        if not selected_field or self.filtered_df.empty or selected_field not in self.headers:
+            self.update_group_display()
+            return
+
+        col_index = self.headers.index(selected_field)
+        for group in build_categorical_groups(self.filtered_df.iloc[:, col_index]):
+            group['color'] = QColor(*group['color'])
+            self.groups.append(group)
+            self.group_colors[group['label']] = group['color']
+
+        self.update_group_display()
+
+    def pick_category_color(self, index):
+        """Allow manual selection of a category color."""
+        current = self.groups[index]['color']
+        color = QColorDialog.getColor(current, self, "Выбрать цвет категории")
+        if color.isValid():
+            self.groups[index]['color'] = color
+            self.group_colors[self.groups[index]['label']] = color
+            self.update_group_display()
+
+    def pick_numeric_group_color(self, index):
+        """Allow manual selection of a numerical group color."""
+        current = self.groups[index]['color']
+        color = QColorDialog.getColor(current, self, "Выбрать цвет группы")
+        if color.isValid():
+            self.groups[index]['color'] = color
+            self.group_colors[self.groups[index]['label']] = color
+            self.update_group_display()
+
+    def on_numerical_grouping_field_changed(self):
+        """
+        Handles the change of the numerical grouping field or number of groups.
+        Resets manual bounds and recalculates group ranges and colors.
+        """
+        self.manual_group_bounds = {} 
+        self.groups = []
+
+        selected_field = self.numerical_group_field_combo.currentText()
+        if not selected_field or self.filtered_df.empty or selected_field not in self.headers:
+            self.update_group_display()
+            return
+
+        self.numerical_field_is_int = self.field_types.get(selected_field) == 'Int'
+        numerical_values = numeric_values(self._numbers(selected_field), self.numerical_field_is_int)
+
+        if not numerical_values:
+            self.update_group_display()
+            return
+
+        end_color = (self.end_color.red(), self.end_color.green(), self.end_color.blue())
+        self.groups = build_numeric_groups(
+            numerical_values,
+            self.num_groups_spinbox.value(),
+            end_color,
+            self.numerical_field_is_int,
+        )
+        for group in self.groups:
+            group['color'] = QColor(*group['color'])
+            self.group_colors[group['label']] = group['color']
+
+        self.update_group_display()
+
+    def update_group_display(self):
+        """Update the displayed grouping information for the current mode."""
+        num_layout = self.numerical_color_display_layout
+        cat_layout = self.categorical_color_display_layout
+
+        for layout in (num_layout, cat_layout):
+            while layout.count() > 1:
+                child = layout.takeAt(1)
+                if child.widget():
+                    child.widget().deleteLater()
+                elif child.layout():
+                    self.clear_layout(child.layout())
+
+        if not self.groups:
+            if self.grouping_mode != 'single':
+                lbl = QLabel("Группы не определены или данные недоступны.")
+                lbl.setStyleSheet("QLabel { color: #555555;margin-left: 10px; }")
+                if self.grouping_mode == 'categorical':
+                    cat_layout.addWidget(lbl)
+                else:
+                    num_layout.addWidget(lbl)
+            return
+
+        if self.grouping_mode == 'numerical':
+            selected_field = self.numerical_group_field_combo.currentText()
+            group_counts = [0] * len(self.groups)
+            if selected_field and not self.filtered_df.empty and self.headers and selected_field in self.headers:
+                group_counts = count_numeric_groups(self._legend_values(selected_field), self.groups)
+
+            for i, group in enumerate(self.groups):
+                g_layout = QHBoxLayout()
+                swatch = QLabel()
+                swatch.setFixedSize(20, 20)
+                swatch.setStyleSheet(f"background-color: {group['color'].name()}; border: 1px solid #888888;")
+                if i < len(self.groups) - 1:
+                    swatch.mousePressEvent = lambda e, idx=i: self.pick_numeric_group_color(idx)
+                g_layout.addWidget(swatch)
+
+                lower_label = QLabel(f"{self._format_range_value(group['range'][0])} - ")
+                lower_label.setStyleSheet("QLabel { color: #333333;}")
+                g_layout.addWidget(lower_label)
+
+                upper_input = QLineEdit(self._format_range_value(group['range'][1]))
+                upper_input.setFixedWidth(80)
+                upper_input.setStyleSheet("QLineEdit { background-color: #EEEEEE; border: 1px solid #CCCCCC; padding: 3px; }")
+
+                if i == len(self.groups) - 1:
+                    upper_input.setReadOnly(True)
+                    upper_input.setStyleSheet("QLineEdit { background-color: #E0E0E0; border: 1px solid #CCCCCC; padding: 3px; color: #888888; }")
+                else:
+                    upper_input.editingFinished.connect(lambda idx=i, sender=upper_input: self.on_group_bound_edited(idx, sender))
+
+                g_layout.addWidget(upper_input)
+
+                count_label = QLabel(f" ({group_counts[i]} элементов)")
+                count_label.setStyleSheet("QLabel { color: #555555;font-size: 9px; }")
+                g_layout.addWidget(count_label)
+
+                g_layout.addStretch(1)
+                num_layout.addLayout(g_layout)
+        elif self.grouping_mode == 'categorical':
+            for i, group in enumerate(self.groups):
+                g_layout = QHBoxLayout()
+                swatch = QLabel()
+                swatch.setFixedSize(20, 20)
+                swatch.setStyleSheet(f"background-color: {group['color'].name()}; border: 1px solid #888888;")
+                swatch.mousePressEvent = lambda e, idx=i: self.pick_category_color(idx)
+                g_layout.addWidget(swatch)
+
+                lbl = QLabel(group['label'])
+                lbl.setStyleSheet("QLabel { color: #333333; }")
+                g_layout.addWidget(lbl)
+                g_layout.addStretch(1)
+                cat_layout.addLayout(g_layout)
+
+    def _numbers(self, field):
+        """Numbers of ``field`` in the filtered rows, from the typed column store."""
+        return self._columns.numbers(field, self._filter_rows)
+
+    def _legend_values(self, field):
+        """Sorted values of the grouping field for the legend counts.
+
+        Parsed and sorted once per filter result, field and type; editing
+        bounds or colors only searches the sorted array.
+        """
+        key = (field, self.numerical_field_is_int)
+        cached = self._legend_cache
+        if cached is None or cached[0] is not self.filtered_df or cached[1] != key:
+            values = sorted_numeric_values(self._numbers(field), self.numerical_field_is_int)
+            self._legend_cache = cached = (self.filtered_df, key, values)
+        return cached[2]
+
+    def clear_layout(self, layout):
+        """
+        Recursively clears all widgets and sub-layouts from a given layout.
+        """
+        if layout is not None:
+            while layout.count():
+                child = layout.takeAt(0)
+                if child.widget() is not None:
+                    child.widget().deleteLater()
+                elif child.layout() is not None:
+                    self.clear_layout(child.layout())
+
+    def on_group_bound_edited(self, group_index, sender):
+        """
+        Handles manual editing of a group's upper boundary.
+        Adjusts the upper boundary of the current group and the lower boundary of the next group.
+        Includes validation to prevent invalid boundary settings.
+        """
+        if group_index == len(self.groups) - 1:
+            QMessageBox.warning(self, "Invalid Action", "The upper bound of the last group cannot be manually edited.")
+            sender.setText(self._format_range_value(self.groups[group_index]['range'][1]))
+            return
+
+        try:
+            text_val = sender.text().replace(',', '.')
+            new_value = int(float(text_val)) if self.numerical_field_is_int else float(text_val)
+        except ValueError:
+            QMessageBox.warning(self, "Неверный ввод", "Пожалуйста введите число.")
+            sender.setText(self._format_range_value(self.groups[group_index]['range'][1]))
+            return
+
+        current_lower_bound = self.groups[group_index]['range'][0]
+        if new_value <= current_lower_bound:
+            QMessageBox.warning(self, "Неправильная граница",
+                                f"Верхняя граница не может быть меньше нижней границы текущей группы ({self._format_range_value(current_lower_bound)}).")
+            sender.setText(self._format_range_value(self.groups[group_index]['range'][1]))
+            return
+
+        if group_index + 1 < len(self.groups):
+            next_upper_bound = self.groups[group_index + 1]['range'][1]
+            if new_value >= next_upper_bound:
+                QMessageBox.warning(self, "Неправильная граница",
+                                    f"Верхняя граница не может быть больше верхней границы следующей группы ({self._format_range_value(next_upper_bound)}).")
+                sender.setText(self._format_range_value(self.groups[group_index]['range'][1]))
+                return
+
+        if group_index not in self.manual_group_bounds:
+            self.manual_group_bounds[group_index] = {}
+        self.manual_group_bounds[group_index]['upper'] = new_value
+
+        self.groups[group_index]['range'][1] = new_value
+        
+        if group_index + 1 < len(self.groups):
+            self.groups[group_index + 1]['range'][0] = new_value
+            if group_index + 1 not in self.manual_group_bounds:
+                self.manual_group_bounds[group_index + 1] = {}
+            self.manual_group_bounds[group_index + 1]['lower'] = new_value
+
+        self.group_colors = {}
+        for i, group in enumerate(self.groups):
+            manual_lower = self.manual_group_bounds.get(i, {}).get('lower')
+            lower_display = manual_lower if manual_lower is not None else group['range'][0]
+
+            manual_upper = self.manual_group_bounds.get(i, {}).get('upper')
+            upper_display = manual_upper if manual_upper is not None else group['range'][1]
+
+            group['label'] = f"{self._format_range_value(lower_display)} - {self._format_range_value(upper_display)}"
+            self.group_colors[group['label']] = group['color']
+
+        self.update_group_display()
+
+
+def main(argv):
+    """Show the window; returns the process exit status."""
+    app = QApplication(argv)
+    ex = KmlGeneratorApp()
+    ex.show()
+    return app.exec()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,307 @@
+"""Streaming KML writer.
+
+Placemarks are serialized as soon as they are produced and spooled to
+temporary files, one per folder, so memory use does not grow with the
+number of rows.  The final document is assembled by concatenating the
+spools in folder order when the writer is closed.
+
+Styles are shared: every distinct combination of colors, icon and label
+visibility is written once at the top of the document and placemarks refer
+to it by ``styleUrl``.
+
+With ``kmz=True`` the document is compressed into a KMZ archive as it is
+assembled, together with the local files registered by
+:meth:`KmlStreamWriter.embed_file`.
+"""
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+from collections import OrderedDict
+from xml.sax.saxutils import escape, quoteattr
+
+KML_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<kml xmlns="http://www.opengis.net/kml/2.2" xmlns:gx="http://www.google.com/kml/ext/2.2">\n'
+    '<Document>\n'
+)
+KML_FOOTER = '</Document>\n</kml>\n'
+
+# Spool records are single lines: placemarks start with '<', references to
+# child folders with this marker followed by the folder id.
+_FOLDER_MARK = '@'
+_MAX_OPEN_SPOOLS = 64
+# Documents larger than this are written with ZIP64 headers
+_ZIP64_THRESHOLD = 1 << 30
+
+
+def text(value):
+    """Escape ``value`` for XML text content, keeping it on a single line."""
+    return escape(str(value)).replace('\r', '&#13;').replace('\n', '&#10;')
+
+
+def kml_color(rgb, alpha=255):
+    """Return a KML ``aabbggrr`` color string for an ``(r, g, b)`` tuple."""
+    r, g, b = rgb
+    return f"{alpha:02x}{b:02x}{g:02x}{r:02x}"
+
+
+def format_coordinates(coords, precision=None):
+    """Format an iterable of ``(x, y[, z])`` tuples for ``<coordinates>``.
+
+    Ordinates are written with ``precision`` decimals, or in full (the
+    shortest representation that round-trips) when it is ``None``.
+    """
+    if precision is None:
+        return ' '.join(','.join(repr(float(c)) for c in xy[:2]) for xy in coords)
+    pattern = f"%.{int(precision)}f,%.{int(precision)}f"
+    return ' '.join([pattern % (xy[0], xy[1]) for xy in coords])
+
+
+def point_xml(x, y, precision=None):
+    return f"<Point><coordinates>{format_coordinates([(x, y)], precision)}</coordinates></Point>"
+
+
+def linestring_xml(coords, precision=None):
+    return f"<LineString><coordinates>{format_coordinates(coords, precision)}</coordinates></LineString>"
+
+
+def polygon_xml(exterior, interiors=(), precision=None):
+    parts = [
+        "<Polygon><outerBoundaryIs><LinearRing><coordinates>",
+        format_coordinates(exterior, precision),
+        "</coordinates></LinearRing></outerBoundaryIs>",
+    ]
+    for ring in interiors:
+        parts.append("<innerBoundaryIs><LinearRing><coordinates>")
+        parts.append(format_coordinates(ring, precision))
+        parts.append("</coordinates></LinearRing></innerBoundaryIs>")
+    parts.append("</Polygon>")
+    return ''.join(parts)
+
+
+def style_xml(icon_color=None, icon_href=None, line_color=None, poly_color=None,
+              hide_label=False, style_id=None):
+    """Serialize a ``<Style>`` element; empty substyles are omitted."""
+    parts = [f"<Style id={quoteattr(style_id)}>" if style_id else "<Style>"]
+    if icon_color or icon_href:
+        parts.append("<IconStyle>")
+        if icon_color:
+            parts.append(f"<color>{icon_color}</color>")
+        if icon_href:
+            parts.append(f"<Icon><href>{text(icon_href)}</href></Icon>")
+        parts.append("</IconStyle>")
+    if hide_label:
+        parts.append("<LabelStyle><scale>0</scale></LabelStyle>")
+    if line_color:
+        parts.append(f"<LineStyle><color>{line_color}</color></LineStyle>")
+    if poly_color:
+        parts.append(f"<PolyStyle><color>{poly_color}</color></PolyStyle>")
+    parts.append("</Style>")
+    return ''.join(parts)
+
+
+def region_xml(west, south, east, north, min_lod_pixels=128, max_lod_pixels=-1):
+    """Serialize a ``<Region>`` for a lon/lat box with its level of detail."""
+    return (
+        "<Region><LatLonAltBox>"
+        f"<north>{north!r}</north><south>{south!r}</south>"
+        f"<east>{east!r}</east><west>{west!r}</west>"
+        "</LatLonAltBox><Lod>"
+        f"<minLodPixels>{min_lod_pixels}</minLodPixels><maxLodPixels>{max_lod_pixels}</maxLodPixels>"
+        "</Lod></Region>"
+    )
+
+
+def network_link_xml(name, href, region=None):
+    """Serialize a ``<NetworkLink>`` loading ``href`` when ``region`` becomes active."""
+    parts = ["<NetworkLink>", f"<name>{text(name)}</name>"]
+    if region:
+        parts.append(region)
+    parts.append(f"<Link><href>{text(href)}</href><viewRefreshMode>onRegion</viewRefreshMode></Link>")
+    parts.append("</NetworkLink>")
+    return ''.join(parts)
+
+
+def placemark_xml(name, geometry, description=None, snippet_lines=0, style_url=None):
+    """Serialize a ``<Placemark>`` on a single line.
+
+    ``geometry`` is an already serialized fragment.
+    """
+    parts = ["<Placemark>", f"<name>{text(name)}</name>"]
+    if description is not None:
+        parts.append(f"<description>{text(description)}</description>")
+        parts.append(f'<Snippet maxLines="{snippet_lines}">{text(description)}</Snippet>')
+    if style_url:
+        parts.append(f"<styleUrl>{style_url}</styleUrl>")
+    parts.append(geometry)
+    parts.append("</Placemark>")
+    return ''.join(parts)
+
+
+class KmlStreamWriter:
+    """Write a KML document with nested folders without keeping it in memory.
+
+    Containers are referred to by integer ids; :attr:`root` is the document
+    itself.  Children keep the order in which they were added, exactly like
+    features appended to an in-memory tree.  Call :meth:`close` to assemble
+    the output file, or :meth:`abort` to discard everything.
+    """
+
+    root = 0
+
+    def __init__(self, output_file, kmz=False):
+        self.output_file = output_file
+        self.kmz = kmz
+        self._tmpdir = tempfile.mkdtemp(prefix='kml_spool_')
+        self._names = {self.root: None}
+        self._has_records = set()
+        self._open = OrderedDict()
+        self._styles = {}
+        self._files = {}
+        self.region = None
+        self.placemark_count = 0
+
+    def _spool_path(self, container):
+        return os.path.join(self._tmpdir, f"{container}.part")
+
+    def _spool(self, container):
+        handle = self._open.get(container)
+        if handle is not None:
+            self._open.move_to_end(container)
+            return handle
+        if len(self._open) >= _MAX_OPEN_SPOOLS:
+            _, oldest = self._open.popitem(last=False)
+            oldest.close()
+        handle = open(self._spool_path(container), 'a', encoding='utf-8')
+        self._open[container] = handle
+        self._has_records.add(container)
+        return handle
+
+    def shared_style(self, icon_color=None, icon_href=None, line_color=None,
+                     poly_color=None, hide_label=False):
+        """Return the ``styleUrl`` of a document style, registering it on first use."""
+        key = (icon_color, icon_href, line_color, poly_color, hide_label)
+        style_id = self._styles.get(key)
+        if style_id is None:
+            style_id = f"style{len(self._styles) + 1}"
+            self._styles[key] = style_id
+        return '#' + style_id
+
+    def embed_file(self, path):
+        """Register a local file to be stored in the KMZ; return its ``href``.
+
+        Files are stored under ``files/`` with their base name, numbered when
+        two different files share a name.  Without ``kmz`` the path is
+        returned unchanged.
+        """
+        if not self.kmz:
+            return path
+        path = os.path.abspath(path)
+        href = self._files.get(path)
+        if href is None:
+            base, ext = os.path.splitext(os.path.basename(path))
+            href = f"files/{base}{ext}"
+            used = set(self._files.values())
+            number = 1
+            while href in used:
+                number += 1
+                href = f"files/{base}-{number}{ext}"
+            self._files[path] = href
+        return href
+
+    def new_folder(self, parent, name):
+        """Create a folder inside ``parent`` and return its id."""
+        folder = len(self._names)
+        self._names[folder] = name
+        self._spool(parent).write(f"{_FOLDER_MARK}{folder}\n")
+        return folder
+
+    def add_placemark(self, container, fragment):
+        """Append a serialized placemark (see :func:`placemark_xml`)."""
+        self.add_feature(container, fragment)
+        self.placemark_count += 1
+
+    def add_feature(self, container, fragment):
+        """Append any other serialized feature, such as a network link."""
+        self._spool(container).write(fragment + '\n')
+
+    def _copy_container(self, out, container):
+        if container not in self._has_records:
+            return
+        with open(self._spool_path(container), encoding='utf-8') as spool:
+            for line in spool:
+                if line.startswith(_FOLDER_MARK):
+                    child = int(line[1:])
+                    out.write(f"<Folder><name>{text(self._names[child])}</name>\n")
+                    self._copy_container(out, child)
+                    out.write("</Folder>\n")
+                else:
+                    out.write(line)
+
+    def _write_document(self, out):
+        out.write(KML_HEADER)
+        for key, style_id in self._styles.items():
+            out.write(style_xml(*key, style_id=style_id))
+            out.write('\n')
+        if self.region:
+            out.write(self.region)
+            out.write('\n')
+        self._copy_container(out, self.root)
+        out.write(KML_FOOTER)
+
+    def _write_kmz(self, path):
+        spooled = sum(os.path.getsize(self._spool_path(c)) for c in self._has_records)
+        with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            # doc.kml goes first: viewers open the first .kml entry of the archive
+            with archive.open('doc.kml', 'w', force_zip64=spooled > _ZIP64_THRESHOLD) as raw:
+                with io.TextIOWrapper(raw, encoding='utf-8') as out:
+                    self._write_document(out)
+            for source, href in self._files.items():
+                archive.write(source, href)
+
+    def close(self):
+        """Assemble the final document and remove the temporary spools.
+
+        The document is written next to ``output_file`` under a ``.part``
+        name and renamed when complete, so a failed write never leaves a
+        truncated file behind.
+        """
+        partial = self.output_file + '.part'
+        try:
+            for handle in self._open.values():
+                handle.close()
+            self._open.clear()
+            if self.kmz:
+                self._write_kmz(partial)
+            else:
+                with open(partial, 'w', encoding='utf-8') as out:
+                    self._write_document(out)
+            os.replace(partial, self.output_file)
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        finally:
+            self._cleanup()
+
+    def abort(self):
+        """Discard the spooled data without writing the output file."""
+        self._cleanup()
+
+    def _cleanup(self):
+        for handle in self._open.values():
+            handle.close()
+        self._open.clear()
+        shutil.rmtree(self._tmpdir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False